@@ -0,0 +1,103 @@
+"""Throughput of concurrent document rendering by number of threads.
+
+Usage: python benchmarks/thread_scaling.py FONT.ttf [--documents N] [--pages N] [--verify]
+
+Every document is rendered from its own Pdf, while all documents share
+the parsed font through a FontCache. On free-threaded Python builds the
+threads run in parallel, elsewhere the GIL limits the scaling.
+
+With --verify, every document rendered on threads is compared with the
+same document rendered on one thread without the font cache, and the
+script exits with an error when any of them differs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from docugenr8_shared.dto import Dto
+from docugenr8_shared.dto import DtoFont
+from docugenr8_shared.dto import DtoFragment
+from docugenr8_shared.dto import DtoPage
+from docugenr8_shared.dto import DtoTextArea
+
+from docugenr8_pdf import FontCache
+from docugenr8_pdf import Pdf
+from docugenr8_pdf.pdf_settings import PDFSettings
+
+
+LINES_PER_PAGE = 50
+FRAGMENTS_PER_LINE = 8
+
+
+def create_dto(font_data: bytes, pages: int, seed: int) -> Dto:
+    dto = Dto()
+    dto.fonts.append(DtoFont("Body", font_data))
+    for page_num in range(pages):
+        dto_page = DtoPage(595, 842)
+        text_area = DtoTextArea(40, 40, 515, 760)
+        for line in range(LINES_PER_PAGE):
+            for column in range(FRAGMENTS_PER_LINE):
+                fragment = DtoFragment(40 + column * 64, 40 + line * 15, None)
+                fragment.chars = f"Row {seed}-{page_num}-{line}-{column} "
+                fragment.baseline = 52 + line * 15
+                fragment.font_name = "Body"
+                fragment.font_size = 10
+                fragment.font_color = (0, 0, 0)
+                text_area.fragments.append(fragment)
+        dto_page.contents.append(text_area)
+        dto.pages.append(dto_page)
+    return dto
+
+
+def render(dto: Dto, font_cache: None | FontCache) -> bytes:
+    settings = PDFSettings()
+    settings.compression = True
+    # /ID does not depend on the time, so renders can be compared
+    settings.deterministic = True
+    settings.font_cache = font_cache
+    return Pdf(dto, settings).output_to_bytes()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("font", help="TrueType font used by the documents")
+    parser.add_argument("--documents", type=int, default=64)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--verify", action="store_true", help="compare threaded renders with sequential ones")
+    args = parser.parse_args()
+    with open(args.font, "rb") as font_file:
+        font_data = font_file.read()
+    dtos = [create_dto(font_data, args.pages, seed) for seed in range(args.documents)]
+    expected = [render(dto, None) for dto in dtos] if args.verify else []
+    font_cache = FontCache()
+    # parses the font once, so every run measures rendering only
+    render(dtos[0], font_cache)
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if is_gil_enabled else 'disabled'}")
+    print(f"{'threads':>8} {'seconds':>10} {'documents/s':>12} {'speedup':>8}")
+    single_thread_rate = 0.0
+    for threads in args.threads:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            outputs = list(executor.map(render, dtos, [font_cache] * len(dtos)))
+        seconds = time.perf_counter() - start
+        if args.verify and outputs != expected:
+            different = sum(
+                output != expected_output for output, expected_output in zip(outputs, expected, strict=True)
+            )
+            sys.exit(f"{different} documents rendered on {threads} threads differ from sequential renders.")
+        rate = len(dtos) / seconds
+        if single_thread_rate == 0:
+            single_thread_rate = rate
+        print(f"{threads:>8} {seconds:>10.3f} {rate:>12.1f} {rate / single_thread_rate:>8.2f}")
+    if args.verify:
+        print(f"All {len(dtos)} documents are byte-identical to sequential renders.")
+
+
+if __name__ == "__main__":
+    main()
@@ -134,6 +134,18 @@ publish() {
     fi
 }
 
+# Function to check that importing the package stays lightweight
+check_import_time() {
+    local import_log
+    import_log=$(python -X importtime -c "import $PACKAGE_NAME" 2>&1 >/dev/null)
+    echo "$import_log" | tail -n 1
+    # heavy dependencies are imported only when a document is built
+    if echo "$import_log" | grep -q -E "fontTools|numpy|concurrent|docugenr8_shared.colors"; then
+        return 1
+    fi
+    return 0
+}
+
 # Function to check code quality
 check_code(){
     if check_venv; then
@@ -163,6 +175,13 @@ check_code(){
         success "Type Check Successful"
     fi
 
+    if ! check_import_time; then
+        check_result=1
+        warning "Import Time Check Failed"
+    else
+        success "Import Time Check Successful"
+    fi
+
     if ! pytest --cov="$PACKAGE_NAME" tests/; then
         check_result=1
         warning "Tests Failed"
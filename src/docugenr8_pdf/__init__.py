@@ -1 +1,11 @@
 from docugenr8_pdf.pdf import Pdf as Pdf
+from docugenr8_pdf.pdf_cache import CompressedStreamCache as CompressedStreamCache
+from docugenr8_pdf.pdf_cache import FontCache as FontCache
+from docugenr8_pdf.pdf_cache import RenderCache as RenderCache
+from docugenr8_pdf.pdf_image import PdfImage as PdfImage
+from docugenr8_pdf.pdf_shard import PdfShard as PdfShard
+from docugenr8_pdf.pdf_shard import merge_shards as merge_shards
+from docugenr8_pdf.pdf_shard import render_shard as render_shard
+from docugenr8_pdf.pdf_split import split_output as split_output
+from docugenr8_pdf.pdf_template import PdfTemplate as PdfTemplate
+from docugenr8_pdf.pdf_text_columns import PdfTextColumns as PdfTextColumns
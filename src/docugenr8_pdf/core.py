@@ -1,7 +1,15 @@
 from __future__ import annotations
 
 import hashlib
+import os
+from collections.abc import Iterable
+from collections.abc import Iterator
 from datetime import datetime
+from typing import BinaryIO
+
+
+# limit of buffers passed to a single os.writev call (IOV_MAX on Linux)
+MAX_WRITE_SEGMENTS = 1024
 
 
 class PdfObj:
@@ -14,7 +22,14 @@ class PdfObj:
             str,
             str | float | list | dict | PdfObj
             ] = {}
-        self.stream = bytearray()
+        # stream bytes are kept as the segments they were added with
+        self.stream_segments: list[bytes | bytearray | memoryview] = []
+        self.stream_length = 0
+        self._owns_last_segment = False
+
+    @property
+    def stream(self) -> bytes:
+        return b"".join(self.stream_segments)
 
     def set_attribute_value(
         self,
@@ -47,46 +62,126 @@ class PdfObj:
             return self.attributes[attribute]
         return None
 
-    def extend_stream(self, value: str | bytes | bytearray) -> None:
-        if not isinstance(value, str | bytes | bytearray):
+    def extend_stream(self, value: str | bytes | bytearray | memoryview) -> None:
+        if not isinstance(value, str | bytes | bytearray | memoryview):
             raise TypeError(
-                "Only strings, bytes and bytearrays can be added to stream"
+                "Only strings, bytes, bytearrays and memoryviews can be added to stream"
             )
         if isinstance(value, str):
             b = bytearray(value.encode("ascii"))
             b.extend(b"\n")
-            self.stream.extend(b)
+            # consecutive text lines share one segment
+            if len(self.stream_segments) > 0 and self._owns_last_segment:
+                self.stream_segments[-1].extend(b)  # type: ignore
+            else:
+                self.stream_segments.append(b)
+            self._owns_last_segment = True
+            self.stream_length += len(b)
         else:
-            self.stream.extend(value)
-        self.set_attribute_value("/Length", len(self.stream))
+            # binary streams are referenced, not copied
+            self.stream_segments.append(value)
+            self._owns_last_segment = False
+            self.stream_length += value.nbytes if isinstance(value, memoryview) else len(value)
+        self.set_attribute_value("/Length", self.stream_length)
 
-    def build(self):
+    def build_segments(self) -> list[bytes | bytearray | memoryview]:
         buffer = bytearray()
         buffer.extend(b"%d 0 obj" % self.obj_num)
         obj_attr = build_attributes(self.attributes) + "\n"
         buffer.extend(obj_attr.encode("ascii"))
-        if len(self.stream) > 0:
-            buffer.extend(b"stream\n")
-            buffer.extend(self.stream)
-            if buffer[-1:] != b"\n":
-                buffer.extend(b"\n")
-            buffer.extend(b"endstream\n")
-        buffer.extend(b"endobj\n")
-        return buffer
+        if self.stream_length == 0:
+            buffer.extend(b"endobj\n")
+            return [buffer]
+        buffer.extend(b"stream\n")
+        segments: list[bytes | bytearray | memoryview] = [buffer]
+        segments.extend(memoryview(segment) for segment in self.stream_segments if len(segment) > 0)
+        if self.stream_segments[-1][-1:] != b"\n":
+            segments.append(b"\nendstream\nendobj\n")
+        else:
+            segments.append(b"endstream\nendobj\n")
+        return segments
+
+    def build(self):
+        return bytearray(b"".join(self.build_segments()))
 
 class Collector:
     def __init__(self) -> None:
         self.obj_counter = 0
+        self.pdf_version = "1.3"
         self.objects: list[PdfObj] = []
-        self.buffer = bytearray()
+        # groups of the catalog /OCProperties, its default order and hidden groups
+        self.optional_content_groups: list[PdfObj] = []
+        self.optional_content_order: list[PdfObj] = []
+        self.optional_content_off: list[PdfObj] = []
         self.generate_catalog_and_pages_objects()
         self.info: None | bytes = None
+        self.document_id: None | bytes = None
 
     def generate_catalog_and_pages_objects(self) -> None:
-        self.catalog_obj: PdfObj = self.new_obj()
-        self.pages_obj: PdfObj = self.new_obj()
+        self.catalog_obj: PdfObj = self.new_obj("/Catalog")
+        self.pages_obj: PdfObj = self.new_obj("/Pages")
         self.catalog_obj.set_attribute_value("/Pages", self.pages_obj)
 
+    def new_optional_content_group(self, name: str, visible: bool) -> PdfObj:
+        # optional content is available from PDF 1.5
+        self.pdf_version = "1.5"
+        group = self.new_obj("/OCG")
+        group.set_attribute_value("/Name", f"({name})")
+        if "/OCProperties" not in self.catalog_obj.attributes:
+            # the catalog refers to these lists, so groups added later are included
+            self.catalog_obj.set_attribute_value(
+                "/OCProperties",
+                {
+                    "/OCGs": self.optional_content_groups,
+                    "/D": {"/Order": self.optional_content_order, "/OFF": self.optional_content_off},
+                },
+            )
+        self.optional_content_groups.append(group)
+        self.optional_content_order.append(group)
+        if not visible:
+            self.optional_content_off.append(group)
+        return group
+
+    def build_page_tree(self, page_objs: list[PdfObj], fan_out: int) -> None:
+        # pages are grouped into intermediate /Pages nodes of at most
+        # fan_out kids, level by level, so every page sits at the same depth
+        if fan_out < 2:
+            raise ValueError("Page tree fan-out must be at least 2.")
+        level: list[tuple[PdfObj, int]] = [(page_obj, 1) for page_obj in page_objs]
+        while len(level) > fan_out:
+            next_level = []
+            for start in range(0, len(level), fan_out):
+                node = self.new_obj("/Pages")
+                next_level.append((node, self._set_kids(node, level[start:start + fan_out])))
+            level = next_level
+        self._set_kids(self.pages_obj, level)
+
+    def _set_kids(self, node: PdfObj, kids: list[tuple[PdfObj, int]]) -> int:
+        count = 0
+        for kid, kid_count in kids:
+            kid.set_attribute_value("/Parent", node)
+            count += kid_count
+        node.set_attribute_value("/Count", count)
+        node.set_attribute_value("/Kids", [kid for kid, _ in kids])
+        return count
+
+    def remove_unreachable_objects(self) -> None:
+        # objects not referenced from the catalog are dropped, the rest
+        # keep their order and are numbered again from 1
+        reachable = {self.catalog_obj}
+        pending = [self.catalog_obj]
+        while len(pending) > 0:
+            obj = pending.pop()
+            for value in obj.attributes.values():
+                for reference in iter_references(value):
+                    if reference not in reachable:
+                        reachable.add(reference)
+                        pending.append(reference)
+        self.objects = [obj for obj in self.objects if obj in reachable]
+        for obj_num, obj in enumerate(self.objects, 1):
+            obj.obj_num = obj_num
+        self.obj_counter = len(self.objects)
+
     def new_obj(self, type_obj=None) -> PdfObj:
         self.obj_counter += 1
         obj = PdfObj(self.obj_counter)
@@ -95,33 +190,48 @@ class Collector:
             obj.set_attribute_value("/Type", type_obj)
         return obj
 
-    def build_pdf(self) -> bytes:
+    def build_header(self) -> bytes:
+        return b"%%PDF-%b\n%%\xE2\xE3\xCF\xD3\n" % self.pdf_version.encode("ascii")
+
+    def build_segments(self) -> list[bytes | bytearray | memoryview]:
         obj_offsets = []
         # header
-        b = self.buffer
-        b.extend(b"%PDF-1.3\n%\xE2\xE3\xCF\xD3\n")
+        segments: list[bytes | bytearray | memoryview] = [self.build_header()]
+        offset = len(segments[0])
         # body
         for obj in self.objects:
-            obj_offsets.append(len(b))
-            b.extend(obj.build())
+            obj_offsets.append(offset)
+            for segment in obj.build_segments():
+                segments.append(segment)
+                offset += len(segment)
         # cross-reference table
-        xref_start = len(b)
+        xref_start = offset
+        b = bytearray()
         b.extend(b"xref\n0 %d\n" % (len(self.objects) + 1))
         b.extend(b"0000000000 65535 f\n")
-        for offset in obj_offsets:
-            b.extend(b"%010d 00000 n\n" % offset)
+        for obj_offset in obj_offsets:
+            b.extend(b"%010d 00000 n\n" % obj_offset)
         # trailer
         b.extend(b"trailer\n<<\n")
         b.extend(b"\t/Root %d 0 R\n" % self.catalog_obj.obj_num)
         b.extend(b"\t/Size %d\n" % (len(self.objects) + 1))
-        b.extend(b"\t/ID [%b]\n" % generate_id(b))
+        segments.append(b)
+        b = bytearray()
+        if self.document_id is None:
+            b.extend(b"\t/ID [%b]\n" % generate_id(segments))
+        else:
+            b.extend(b"\t/ID [%b]\n" % self.document_id)
         if self.info is not None:
             b.extend(b"\t/Info %b\n" % self.info)
         b.extend(b">>\n")
         b.extend(b"startxref\n")
         b.extend(b"%d\n" % xref_start)
         b.extend(b"%%EOF")
-        return bytes(b)
+        segments.append(b)
+        return segments
+
+    def build_pdf(self) -> bytes:
+        return b"".join(self.build_segments())
 
 def build_attributes(
     value: str | float | list | dict | PdfObj,
@@ -136,12 +246,7 @@ def build_attributes(
     # recursion with type of list
     if isinstance(value, list):
         obj_list = [build_attributes(item, tab) for item in value]
-        result = "["
-        for obj_item in obj_list:
-            result += obj_item + " "
-        result = result[:-1]
-        result += "]"
-        return result
+        return "[" + " ".join(obj_list) + "]"
     # recursion with type of dict
     if isinstance(value, dict):
         tabs = tab * "\t"
@@ -154,15 +259,103 @@ def build_attributes(
     raise TypeError(f"The value of a type {type(value).__name__} "
                     "cannot be added to attributes.")
 
+def iter_references(
+    value: str | float | list | dict | PdfObj
+    ) -> Iterator[PdfObj]:
+    # base case
+    if isinstance(value, PdfObj):
+        yield value
+    # recursion with type of list
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_references(item)
+    # recursion with type of dict
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_references(item)
+
 def get_reference(obj: PdfObj) -> str:
     if not isinstance(obj, PdfObj):
         raise TypeError("Cannot create a reference string without PdfObj")
     return f"{obj.obj_num} 0 R"
 
-def generate_id(buffer: bytes | bytearray) -> bytes:
+def generate_id(buffer: bytes | bytearray | Iterable[bytes | bytearray | memoryview]) -> bytes:
     now = datetime.now().strftime("%Y%m%d%H%M%S").encode("ascii")
-    salted_buffer = buffer + now
     id_hash = hashlib.new("md5", usedforsecurity=False)
-    id_hash.update(salted_buffer)
+    if isinstance(buffer, bytes | bytearray):
+        id_hash.update(buffer)
+    else:
+        for segment in buffer:
+            id_hash.update(segment)
+    id_hash.update(now)
     hash_hex = id_hash.hexdigest().upper()
+    return format_id(hash_hex)
+
+def format_id(hash_hex: str) -> bytes:
     return f"<{hash_hex}><{hash_hex}>".encode("ascii")
+
+def update_digest(
+    digest: hashlib._Hash,
+    value: object,
+    visited: dict[int, int]
+    ) -> None:
+    # base case
+    if value is None or isinstance(value, bool | int | float | str):
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+        return
+    # base case
+    if isinstance(value, bytes | bytearray | memoryview):
+        digest.update(b"bytes:%d;" % len(value))
+        digest.update(value)
+        return
+    # recursion with type of list or tuple
+    if isinstance(value, list | tuple):
+        digest.update(b"%s:%d[" % (type(value).__name__.encode("ascii"), len(value)))
+        for item in value:
+            update_digest(digest, item, visited)
+        digest.update(b"]")
+        return
+    # recursion with type of dict
+    if isinstance(value, dict):
+        digest.update(b"dict:%d{" % len(value))
+        for key in sorted(value):
+            update_digest(digest, key, visited)
+            update_digest(digest, value[key], visited)
+        digest.update(b"}")
+        return
+    attributes = getattr(value, "__dict__", None)
+    if attributes is None:
+        raise TypeError(f"The value of a type {type(value).__name__} "
+                        "cannot be added to digest.")
+    # back references and shared objects are recorded by visiting order
+    if id(value) in visited:
+        digest.update(b"ref:%d;" % visited[id(value)])
+        return
+    visited[id(value)] = len(visited)
+    digest.update(f"{type(value).__name__}{{".encode())
+    for key in sorted(attributes):
+        digest.update(key.encode())
+        update_digest(digest, attributes[key], visited)
+    digest.update(b"}")
+
+def write_segments(
+    file: BinaryIO,
+    segments: list[bytes | bytearray | memoryview]
+    ) -> None:
+    if not hasattr(os, "writev"):
+        file.writelines(segments)
+        return
+    file.flush()
+    file_descriptor = file.fileno()
+    pending = [memoryview(segment) for segment in segments if len(segment) > 0]
+    index = 0
+    while index < len(pending):
+        written = os.writev(file_descriptor, pending[index:index + MAX_WRITE_SEGMENTS])
+        # skip fully written segments and trim a partially written one
+        while written > 0:
+            segment_length = len(pending[index])
+            if written < segment_length:
+                pending[index] = pending[index][written:]
+                break
+            written -= segment_length
+            index += 1
@@ -1,56 +1,260 @@
-from docugenr8_shared.dto import Dto
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from functools import partial
+from typing import TYPE_CHECKING
 
 from .core import Collector
+from .core import format_id
+from .core import update_digest
+from .core import write_segments
 from .pdf_font import PdfFont
 
 # from .pdf_info import PdfInfo
+from .pdf_linearization import Linearizer
 from .pdf_page import PdfPage
 from .pdf_settings import PDFSettings
+from .pdf_standard_font import PdfStandardFont
+
+
+if TYPE_CHECKING:
+    from docugenr8_shared.dto import Dto
+    from docugenr8_shared.dto import DtoFont
+    from docugenr8_shared.dto import DtoPage
+
+    from .core import PdfObj
+    from .pdf_cache import FontCache
+
+
+def create_font(dto_font: DtoFont, standard_fonts: dict[str, str]) -> PdfFont | PdfStandardFont:
+    if dto_font.name in standard_fonts:
+        return PdfStandardFont(dto_font.name, standard_fonts[dto_font.name])
+    return PdfFont(dto_font.name, dto_font.raw_data)
+
+
+def create_fonts(
+    dto_fonts: list[DtoFont],
+    standard_fonts: dict[str, str],
+    font_cache: None | FontCache = None,
+) -> dict[str, PdfFont | PdfStandardFont]:
+    # names with the same font data share one font, which is parsed,
+    # subsetted and embedded once with one cid numbering for all names
+    fonts: dict[str, PdfFont | PdfStandardFont] = {}
+    fonts_by_data: dict[tuple[str, str], PdfFont | PdfStandardFont] = {}
+    for dto_font in dto_fonts:
+        if dto_font.name in standard_fonts:
+            font_data = ("standard", standard_fonts[dto_font.name])
+        elif isinstance(dto_font.raw_data, bytes | bytearray):
+            font_data = ("data", hashlib.sha256(dto_font.raw_data).hexdigest())
+        else:
+            font_data = ("path", os.path.realpath(dto_font.raw_data))
+        if font_data not in fonts_by_data:
+            if font_cache is None:
+                fonts_by_data[font_data] = create_font(dto_font, standard_fonts)
+            else:
+                pdf_font = font_cache.fork(font_data, partial(create_font, dto_font, standard_fonts))
+                # the cached font may have been created for another name
+                pdf_font.name = dto_font.name
+                fonts_by_data[font_data] = pdf_font
+        fonts[dto_font.name] = fonts_by_data[font_data]
+    return fonts
+
+
+def unique_fonts(fonts: dict[str, PdfFont | PdfStandardFont]) -> list[PdfFont | PdfStandardFont]:
+    return list({id(font): font for font in fonts.values()}.values())
 
 
 class Pdf:
-    def __init__(self, dto: None | Dto = None) -> None:
+    def __init__(self, dto: None | Dto = None, settings: None | PDFSettings = None) -> None:
         self._collector = Collector()
-        self.fonts: dict[str, PdfFont] = {}
+        self.fonts: dict[str, PdfFont | PdfStandardFont] = {}
         # self.info = PdfInfo(self._collector)
         self.pages: list[PdfPage] = []
-        self.settings = PDFSettings()
+        # settings used while parsing the dto have to be given here
+        self.settings = PDFSettings() if settings is None else settings
+        self._digest = hashlib.new("md5", usedforsecurity=False)
+        # what the document is made from, added to the digest only when
+        # deterministic output or the render cache needs it
+        self._digest_values: list[object] = []
+        self._output: None | tuple[tuple, list[bytes | bytearray | memoryview]] = None
+        # renders of one document from several threads run one at a time
+        self._output_lock = threading.Lock()
         if dto is not None:
             self._parse_dto(dto)
 
     def _parse_dto(self, dto: Dto) -> None:
-        for dto_font in dto.fonts:
-            pdf_font = PdfFont(dto_font.name, dto_font.raw_data)
-            self.fonts[dto_font.name] = pdf_font
-        for dto_page in dto.pages:
-            pdf_page = PdfPage(dto_page.width, dto_page.height)
+        fonts = create_fonts(dto.fonts, self.settings.standard_fonts, self.settings.font_cache)
+        for font_name, pdf_font in fonts.items():
+            self.add_font(font_name, pdf_font)
+        self.add_dto_pages(dto.pages)
+
+    def add_font(self, font_name: str, pdf_font: PdfFont | PdfStandardFont) -> None:
+        # for documents assembled from fonts created or forked elsewhere
+        self._digest_values.append((font_name, pdf_font.source_fingerprint()))
+        self.fonts[font_name] = pdf_font
+
+    def add_dto_pages(self, dto_pages: list[DtoPage]) -> None:
+        # pages are drawn with the fonts added before them
+        for dto_page in dto_pages:
+            self._digest_values.append(dto_page)
+            pdf_page = PdfPage(dto_page.width, dto_page.height, self.settings.content_spill_threshold)
             self.pages.append(pdf_page)
             pdf_page.add_dto_page_contents(dto_page.contents, self.fonts, self.settings.debug)
 
-    def _build_pdf_object_tree(self) -> None:
-        self._collector.pages_obj.set_attribute_value("/Count", len(self.pages))
+    def close(self) -> None:
+        # releases spilled page contents and font files, the document
+        # cannot be written after it is closed
+        self._output = None
+        for page in self.pages:
+            page.close()
+        for font in unique_fonts(self.fonts):
+            font.close()
+
+    def set_digest(self, digest: hashlib._Hash) -> None:
+        # for documents not parsed from a dto, digest of what they are made from
+        self._digest = digest.copy()
+        self._digest_values = []
+
+    def add_to_digest(self, value: object) -> None:
+        self._digest_values.append(value)
+
+    def _output_settings(self) -> tuple:
+        return (
+            self.settings.compression,
+            self.settings.decimal_precision,
+            self.settings.debug,
+            self.settings.debug_layer_visible,
+            self.settings.linearize,
+            self.settings.page_tree_fan_out,
+            self.settings.font_embedding_profile,
+        )
+
+    def document_digest(self) -> str:
+        for value in self._digest_values:
+            update_digest(self._digest, value, {})
+        self._digest_values = []
+        digest = self._digest.copy()
+        update_digest(digest, self._output_settings(), {})
+        # images and text columns are drawn on pages directly, not through the dto
+        update_digest(digest, [page.direct_contents for page in self.pages], {})
+        return digest.hexdigest().upper()
+
+    def _output_key(self) -> tuple:
+        # page streams only grow and fonts only gain cids, so their
+        # lengths tell whether the document changed since the last output
+        return (
+            self._output_settings(),
+            self.settings.deterministic,
+            tuple((id(page), page.contents_length()) for page in self.pages),
+            tuple((font_name, id(font), font.glyph_count()) for font_name, font in self.fonts.items()),
+        )
+
+    def _build_pdf_object_tree(self, used_fonts: list[PdfFont | PdfStandardFont]) -> None:
         # if self.info.has_value():
         #     self.info.build()
         for page in self.pages:
             page.generate_pdf_obj(self._collector)
-        for font in self.fonts.values():
+        if any(page.has_debug_layer for page in self.pages):
+            debug_layer_obj = self._collector.new_optional_content_group(
+                "Layout debug", self.settings.debug_layer_visible
+            )
+            for page in self.pages:
+                page.debug_layer_obj = debug_layer_obj
+        for font in used_fonts:
             font.generate_pdf_obj(self._collector)
+        # identical images of all pages share one XObject
+        image_objs: dict[str, PdfObj] = {}
+        for page in self.pages:
+            for image in page.page_images():
+                if image.digest not in image_objs:
+                    image_objs[image.digest] = image.generate_pdf_obj(self._collector)
+            page.image_objs = image_objs
+
+    def _used_fonts(self) -> list[PdfFont | PdfStandardFont]:
+        # fonts no page refers to are neither subsetted nor embedded
+        page_fonts = {id(font) for page in self.pages for font in page.page_fonts()}
+        return [font for font in unique_fonts(self.fonts) if id(font) in page_fonts]
+
+    def output_to_segments(self) -> list[bytes | bytearray | memoryview]:
+        # repeated output of an unchanged document reuses the last result
+        with self._output_lock:
+            output_key = self._output_key()
+            if self._output is None or self._output[0] != output_key:
+                self._output = (output_key, self._render_output())
+            return self._output[1]
+
+    def _render_output(self) -> list[bytes | bytearray | memoryview]:
+        if not self.settings.deterministic:
+            return self._render(None)
+        document_digest = self.document_digest()
+        document_id = format_id(document_digest)
+        render_cache = self.settings.render_cache
+        if render_cache is None:
+            return self._render(document_id)
+        cached = render_cache.get(document_digest)
+        if cached is None:
+            cached = b"".join(self._render(document_id))
+            render_cache.put(document_digest, cached)
+        return [cached]
 
     def output_to_bytes(self) -> bytes:
-        self._build_pdf_object_tree()
+        segments = self.output_to_segments()
+        if len(segments) == 1 and isinstance(segments[0], bytes):
+            return segments[0]
+        return b"".join(segments)
+
+    def _render(self, document_id: None | bytes) -> list[bytes | bytearray | memoryview]:
+        # objects are created anew for every render
+        self._collector = Collector()
+        self._collector.document_id = document_id
+        used_fonts = self._used_fonts()
+        self._build_pdf_object_tree(used_fonts)
+        if self.settings.font_workers > 0:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=self.settings.font_workers) as executor:
+                font_jobs = [
+                    executor.submit(
+                        font.prepare_streams,
+                        self.settings.compression,
+                        self.settings.font_embedding_profile,
+                        self.settings.compressed_stream_cache,
+                    )
+                    for font in used_fonts
+                ]
+                self._build_pages()
+                for font_job in font_jobs:
+                    font_job.result()
+        else:
+            self._build_pages()
+        for font in used_fonts:
+            font.build(
+                self.settings.compression,
+                self.settings.font_embedding_profile,
+                self.settings.compressed_stream_cache,
+            )
+        self._collector.remove_unreachable_objects()
+        if self.settings.linearize and len(self.pages) > 0:
+            page_objs = [page.page_obj for page in self.pages if page.page_obj is not None]
+            linearizer = Linearizer(self._collector, page_objs, self.settings.compression)
+            return linearizer.build_segments()
+        return self._collector.build_segments()
+
+    def _build_pages(self) -> None:
+        page_objs = []
         for page in self.pages:
             page.build(
                 self.settings.compression,
+                self.settings.compressed_stream_cache,
             )
             if page.page_obj is None:
                 raise ValueError("Page object not defined.")
-            page.page_obj.set_attribute_value("/Parent", self._collector.pages_obj)
-            self._collector.pages_obj.add_attribute_value("/Kids", page.page_obj)
-        for font in self.fonts.values():
-            font.build(self.settings.compression)
-        return self._collector.build_pdf()
+            page_objs.append(page.page_obj)
+        self._collector.build_page_tree(page_objs, self.settings.page_tree_fan_out)
 
     def output_to_file(self, file: str):
-        b = self.output_to_bytes()
-        with open(file, "wb") as f:
-            f.write(b)
+        segments = self.output_to_segments()
+        with open(file, "wb", buffering=0) as f:
+            write_segments(f, segments)
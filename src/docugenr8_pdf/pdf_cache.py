@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from .pdf_font import PdfFont
+    from .pdf_standard_font import PdfStandardFont
+
+
+# part of the cache key, so streams compressed with other settings never match
+COMPRESSION_SETTINGS = b"zlib:-1"
+# stream files are named by the sha256 hex digest of the raw stream
+STREAM_FILE_NAME_LENGTH = 64
+# a directory over its bound is pruned to this part of it, so it is not
+# scanned again on every write
+PRUNED_DIRECTORY_FRACTION = 0.75
+
+
+class RenderCache:
+    """Bounded LRU cache of rendered documents keyed by document digest."""
+
+    def __init__(self, max_entries: int = 128, max_size: int = 64 * 1024 * 1024) -> None:
+        if max_entries < 1:
+            raise ValueError("Render cache must hold at least one entry.")
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+
+class FontCache:
+    """Bounded LRU cache of parsed fonts keyed by font data.
+
+    Documents get forks of the cached fonts. A fork shares the parsed font
+    but keeps its own cids, so the cached fonts are never changed and can
+    be used by documents rendered on several threads at the same time.
+    A font missing from the cache is parsed by one thread, while the other
+    threads asking for it wait and then fork the parsed font.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        if max_entries < 1:
+            raise ValueError("Font cache must hold at least one entry.")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, str], PdfFont | PdfStandardFont] = OrderedDict()
+        # set once the font of the key is parsed and cached, or parsing failed
+        self._parsing: dict[tuple[str, str], threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def fork(
+        self,
+        key: tuple[str, str],
+        create_font: Callable[[], PdfFont | PdfStandardFont],
+    ) -> PdfFont | PdfStandardFont:
+        while True:
+            with self._lock:
+                font = self._entries.get(key)
+                if font is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return font.fork()
+                parsed = self._parsing.get(key)
+                if parsed is None:
+                    self.misses += 1
+                    parsed = self._parsing[key] = threading.Event()
+                    break
+            # another thread parses this font, which is then taken from the cache
+            parsed.wait()
+        try:
+            # parsed outside of the lock, so other fonts are not held up
+            font = self._parse(create_font)
+            with self._lock:
+                self._entries[key] = font
+                while len(self._entries) > self.max_entries:
+                    # forks still in use keep evicted fonts alive
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                del self._parsing[key]
+            parsed.set()
+        return font.fork()
+
+    def _parse(self, create_font: Callable[[], PdfFont | PdfStandardFont]) -> PdfFont | PdfStandardFont:
+        font = create_font()
+        from .pdf_font import PdfFont
+
+        if isinstance(font, PdfFont):
+            # built on the cached font, so all forks share the tables,
+            # numpy is optional and without it the tables are not used
+            with contextlib.suppress(ImportError):
+                font.glyph_tables()
+        return font
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class CompressedStreamCache:
+    """Bounded LRU cache of compressed streams keyed by digest of raw stream.
+
+    One cache given to the settings of all documents is shared by the whole
+    process. With a directory, compressed streams are also written there
+    and read back when they are no longer in memory, also by other processes.
+    When the stream files in the directory grow over max_directory_size
+    bytes, the least recently written or read ones are removed. The bound
+    is kept per cache, so files written by other processes meanwhile are
+    only counted at the next pruning. With max_directory_size None the
+    directory grows without bound. Files that cannot be read or written
+    are treated as not cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_size: int = 64 * 1024 * 1024,
+        directory: None | str | os.PathLike[str] = None,
+        max_directory_size: None | int = 1024 * 1024 * 1024,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("Compressed stream cache must hold at least one entry.")
+        self.max_entries = max_entries
+        self.max_size = max_size
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_directory_size = max_directory_size
+        # size of the stream files, counted when the directory is first written
+        self._directory_size: None | int = None
+        self._directory_lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def compress(self, chunks: list[bytes | bytearray | memoryview]) -> bytes:
+        # the stream is given in chunks, so it does not have to be joined
+        digest = hashlib.sha256(COMPRESSION_SETTINGS)
+        for chunk in chunks:
+            digest.update(chunk)
+        key = digest.hexdigest()
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+        compressed = self._read_file(key)
+        if compressed is None:
+            compressor = zlib.compressobj()
+            compressed = b"".join([*(compressor.compress(chunk) for chunk in chunks), compressor.flush()])
+            self._write_file(key, compressed)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.disk_hits += 1
+        self._put(key, compressed)
+        return compressed
+
+    def _put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = value
+            self.size += len(value)
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _read_file(self, key: str) -> None | bytes:
+        if self.directory is None:
+            return None
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as cache_file:
+                compressed = cache_file.read()
+        except OSError:
+            return None
+        # files read recently are removed last when the directory is pruned
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        return compressed
+
+    def _write_file(self, key: str, value: bytes) -> None:
+        if self.directory is None:
+            return
+        # written under another name first, so readers never see a partial file
+        try:
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+        except OSError:
+            return
+        try:
+            with os.fdopen(file_descriptor, "wb") as cache_file:
+                cache_file.write(value)
+            os.replace(temporary_path, os.path.join(self.directory, key))
+        except OSError:
+            # the stream is still used, it is only not cached on disk
+            return
+        finally:
+            # left behind only when the write or the rename failed
+            if os.path.exists(temporary_path):
+                with contextlib.suppress(OSError):
+                    os.unlink(temporary_path)
+        self._bound_directory(len(value))
+
+    def _bound_directory(self, written: int) -> None:
+        if self.directory is None or self.max_directory_size is None:
+            return
+        with self._directory_lock:
+            if self._directory_size is not None:
+                self._directory_size += written
+                if self._directory_size <= self.max_directory_size:
+                    return
+            stream_files = self._stream_files(self.directory)
+            self._directory_size = sum(size for _, size, _ in stream_files)
+            if self._directory_size <= self.max_directory_size:
+                return
+            # oldest modification time first, which reads also update
+            for _, size, path in sorted(stream_files):
+                if self._directory_size <= self.max_directory_size * PRUNED_DIRECTORY_FRACTION:
+                    break
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+                    self._directory_size -= size
+
+    def _stream_files(self, directory: str | os.PathLike[str]) -> list[tuple[int, int, str]]:
+        # modification time, size and path of each stream file, other files are left alone
+        stream_files = []
+        with contextlib.suppress(OSError), os.scandir(directory) as entries:
+            for entry in entries:
+                if len(entry.name) != STREAM_FILE_NAME_LENGTH or not entry.is_file():
+                    continue
+                with contextlib.suppress(OSError):
+                    stat = entry.stat()
+                    stream_files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return stream_files
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+
+
+def compress_chunks(
+    chunks: list[bytes | bytearray | memoryview],
+    compressed_stream_cache: None | CompressedStreamCache,
+) -> bytes:
+    if compressed_stream_cache is not None:
+        return compressed_stream_cache.compress(chunks)
+    if len(chunks) == 1:
+        return zlib.compress(chunks[0])
+    compressor = zlib.compressobj()
+    return b"".join([*(compressor.compress(chunk) for chunk in chunks), compressor.flush()])
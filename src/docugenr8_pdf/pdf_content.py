@@ -1,13 +1,124 @@
-from math import cos
-from math import radians
-from math import sin
-from math import tan
+import contextlib
+import mmap
+import re
+import tempfile
+import weakref
+import zlib
+from typing import BinaryIO
+
+from .pdf_cache import CompressedStreamCache
+
+
+# spilled contents are read back in chunks of this size for compression
+SPILL_READ_SIZE = 1024 * 1024
+# bytes of cids that are escaped in literal strings
+LITERAL_SPECIAL_BYTES = re.compile(rb"[\\()\r]")
+LITERAL_ESCAPES = {b"\\": b"\\\\", b"(": b"\\(", b")": b"\\)", b"\r": b"\\r"}
+
+
+def escape_literal(cid_bytes: bytes | bytearray) -> bytes | bytearray:
+    # cids counted up skip these bytes, identity cids may contain them
+    if LITERAL_SPECIAL_BYTES.search(cid_bytes) is None:
+        return cid_bytes
+    return LITERAL_SPECIAL_BYTES.sub(lambda match: LITERAL_ESCAPES[match.group()], cid_bytes)
+
+
+def fill_color_operator(rgb: tuple[int, int, int]) -> str:
+    return f"{rgb[0] / 255} {rgb[1] / 255} {rgb[2] / 255} rg\n"
 
 
 class PdfContent:  # noqa: PLR0904
-    def __init__(self):
+    def __init__(self, spill_threshold: None | int = None):
         self.pdf_version = "1.3"
         self.stream: bytearray = bytearray()
+        # contents given out for output, which are never changed again
+        self._chunks: list[bytearray] = []
+        self._chunks_length = 0
+        # once the contents outgrow the threshold, they are moved to a
+        # temporary file and only the contents added after that stay in memory
+        self.spill_threshold = spill_threshold
+        self._spill_file: None | BinaryIO = None
+        self._spill_file_finalizer: None | weakref.finalize[[], PdfContent] = None
+        self._spilled_length = 0
+        self._spilled_map: None | mmap.mmap = None
+        self._spilled_view: None | memoryview = None
+
+    def spill_if_needed(self) -> None:
+        if self.spill_threshold is None or self._chunks_length + len(self.stream) <= self.spill_threshold:
+            return
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile()
+            # the file is also closed when the contents are discarded without close
+            self._spill_file_finalizer = weakref.finalize(self, self._spill_file.close)
+        for chunk in [*self._chunks, self.stream]:
+            self._spill_file.write(chunk)
+        self._spilled_length += self._chunks_length + len(self.stream)
+        self._release_spilled_view()
+        self._chunks = []
+        self._chunks_length = 0
+        self.stream = bytearray()
+
+    def _release_spilled_view(self) -> None:
+        if self._spilled_map is None or self._spilled_view is None:
+            return
+        self._spilled_view.release()
+        # output still holding views of the map keeps it open until they are gone
+        with contextlib.suppress(BufferError):
+            self._spilled_map.close()
+        self._spilled_map = None
+        self._spilled_view = None
+
+    def close(self) -> None:
+        self._release_spilled_view()
+        if self._spill_file_finalizer is not None:
+            self._spill_file_finalizer()
+        self._spill_file = None
+        self._spill_file_finalizer = None
+        self._spilled_length = 0
+        self._chunks = []
+        self._chunks_length = 0
+        self.stream = bytearray()
+
+    def length(self) -> int:
+        return self._spilled_length + self._chunks_length + len(self.stream)
+
+    def segments(self) -> list[bytearray | memoryview]:
+        # the stream is given out as it is, so later contents go to a new one
+        if len(self.stream) > 0:
+            self._chunks.append(self.stream)
+            self._chunks_length += len(self.stream)
+            self.stream = bytearray()
+        if self._spill_file is None:
+            return list(self._chunks)
+        # spilled contents are memory-mapped, so they are written out
+        # without being read into memory
+        if self._spilled_view is None:
+            self._spill_file.flush()
+            self._spilled_map = mmap.mmap(self._spill_file.fileno(), self._spilled_length, access=mmap.ACCESS_READ)
+            self._spilled_view = memoryview(self._spilled_map)
+        return [self._spilled_view, *self._chunks]
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.segments())
+
+    def compress(self, compressed_stream_cache: None | CompressedStreamCache = None) -> bytes:
+        if compressed_stream_cache is not None:
+            # spilled contents are hashed and compressed through the memory map
+            return compressed_stream_cache.compress(self.segments())
+        if self._spill_file is None and len(self._chunks) == 0:
+            return zlib.compress(self.stream)
+        compressor = zlib.compressobj()
+        compressed = bytearray()
+        if self._spill_file is not None:
+            self._spill_file.flush()
+            self._spill_file.seek(0)
+            while chunk := self._spill_file.read(SPILL_READ_SIZE):
+                compressed.extend(compressor.compress(chunk))
+            self._spill_file.seek(0, 2)
+        for chunk in [*self._chunks, self.stream]:
+            compressed.extend(compressor.compress(chunk))
+        compressed.extend(compressor.flush())
+        return bytes(compressed)
 
     def add_savestate(self) -> None:
         output = "q\n".encode("ascii")
@@ -18,15 +129,7 @@ class PdfContent:  # noqa: PLR0904
         self.stream.extend(output)
 
     def add_fill_color(self, rgb: tuple[int, int, int]) -> None:
-        pdf_r = rgb[0] / 255
-        pdf_g = rgb[1] / 255
-        pdf_b = rgb[2] / 255
-        output = f"{pdf_r} {pdf_g} {pdf_b} rg\n"
-        self.stream.extend(output.encode("ascii"))
-
-    def add_page_font_with_size(self, page_font: str, font_size: float) -> None:
-        output = f"BT /{page_font} {font_size} Tf ET\n"
-        self.stream.extend(output.encode("ascii"))
+        self.stream.extend(fill_color_operator(rgb).encode("ascii"))
 
     def add_line_color(self, rgb: tuple[int, int, int]) -> None:
         pdf_r = rgb[0] / 255
@@ -104,40 +207,59 @@ class PdfContent:  # noqa: PLR0904
         output = "Q\n"
         self.stream.extend(output.encode("ascii"))
 
-    def add_rotate(self, x_origin: float, y_origin: float, degrees: float) -> None:
-        cos_r = cos(radians(degrees))
-        sin_r = sin(radians(degrees))
-        output = (
-            f"1 0 0 1 {x_origin} {y_origin} cm\n"
-            f"{cos_r} "
-            f"{sin_r} "
-            f"-{sin_r} "
-            f"{sin_r} "
-            f"0 0 cm\n"
-            f"1 0 0 1 -{x_origin} -{y_origin} cm\n"
-        )
-        self.stream.extend(output.encode("ascii"))
-
-    def add_skew(self, x_pos: float, y_pos: float, skew_vertical: float, skew_horizontal: float) -> None:
-        tan_vertical = tan(radians(skew_vertical))
-        tan_horizontal = tan(radians(skew_horizontal))
-        output = (
-            f"1 0 0 1 {x_pos} {y_pos} cm\n"
-            f"1 "
-            f"{tan_vertical} "
-            f"{tan_horizontal} "
-            f"1 "
-            f"0 0 cm\n"
-            f"1 0 0 1 -{x_pos} -{y_pos} cm\n"
-        )
-        self.stream.extend(output.encode("ascii"))
-
-    def add_text(self, x: float, y: float, cid_bytes: bytes) -> None:
-        output = bytearray()
-        x1 = str(x).encode("ascii")
-        y1 = str(y).encode("ascii")
-        output.extend(b"BT %b %b Td (%b) Tj ET\n" % (x1, y1, cid_bytes))
+    def add_transform(self, matrix: tuple[float, ...]) -> None:
+        output = " ".join(str(value) for value in matrix) + " cm\n"
+        self.stream.extend(output.encode("ascii"))
+
+    def add_optional_content_begin(self, properties_name: str) -> None:
+        output = f"/OC /{properties_name} BDC\n"
+        self.stream.extend(output.encode("ascii"))
+
+    def add_optional_content_end(self) -> None:
+        self.stream.extend(b"EMC\n")
+
+    def add_xobject(self, name: str) -> None:
+        output = f"/{name} Do\n"
+        self.stream.extend(output.encode("ascii"))
+
+    def add_translate(self, x: float, y: float) -> None:
+        output = f"1 0 0 1 {x} {y} cm\n"
+        self.stream.extend(output.encode("ascii"))
+
+    def add_path(self, path: bytes) -> None:
+        self.stream.extend(path)
+
+    def add_text_begin(self) -> None:
+        self.stream.extend(b"BT\n")
+
+    def add_text_end(self) -> None:
+        self.stream.extend(b"ET\n")
+
+    def add_text_font(self, page_font: str, font_size: float) -> None:
+        output = f"/{page_font} {font_size} Tf\n"
+        self.stream.extend(output.encode("ascii"))
+
+    def add_text_position(self, x_offset: float, y_offset: float) -> None:
+        # offsets are relative to the start of the previous text line
+        output = f"{x_offset} {y_offset} Td\n"
+        self.stream.extend(output.encode("ascii"))
+
+    def add_text_run(self, segments: list[tuple[float, bytes | bytearray]]) -> None:
+        # each segment is the TJ position adjustment preceding its cids
+        output = bytearray(b"[")
+        for adjustment, cid_bytes in segments:
+            if adjustment != 0:
+                output.extend(str(adjustment).encode("ascii"))
+            output.extend(b"(%b)" % escape_literal(cid_bytes))
+        output.extend(b"] TJ\n")
         self.stream.extend(output)
+        # text areas can be large enough to pass the threshold on their own
+        self.spill_if_needed()
+
+    def add_text_object(self, text_object: bytes) -> None:
+        # text object made at once, from BT to ET
+        self.stream.extend(text_object)
+        self.spill_if_needed()
 
     def add_fill_and_shape(self, has_fill: bool, has_stroke: bool) -> None:
         style = ""
@@ -1,16 +1,42 @@
-import logging
+from __future__ import annotations
+
+import copy
+import os
 import re
-import zlib
+import struct
+import threading
+from collections.abc import Iterable
+from functools import lru_cache
 from io import BytesIO
-
-from fontTools import subset
-from fontTools import ttLib
+from typing import TYPE_CHECKING
 
 from .core import Collector
 from .core import PdfObj
+from .pdf_cache import CompressedStreamCache
+from .pdf_cache import compress_chunks
+from .pdf_font_tables import FontTables
+from .pdf_font_tables import open_font_source
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    from fontTools import ttLib
 
 
 MAX_TWO_BYTE_VALUE = 65535
+MAX_STREAM_CACHE_ENTRIES = 64
+# prefix of the font name telling apart subsets of the same font
+DEFAULT_SUBSET_TAG = "MPDFAA"
+# subsetter options and tables dropped on top of the layout tables
+EMBEDDING_PROFILES: dict[str, tuple[dict[str, object], list[str]]] = {
+    # all tables and hinting of the font are kept
+    "fidelity": ({}, []),
+    # hinting, kerning and all but the basic names are removed
+    "minimal": (
+        {"hinting": False, "name_IDs": [1, 2, 6], "name_languages": [0x0409], "name_legacy": False},
+        ["kern", "gasp", "BASE", "FFTM"],
+    ),
+}
 CARRIAGE_RETURN = 13
 TAB = 9
 NEW_LINE = 10
@@ -33,23 +59,54 @@ FORBIDDEN_CIDS = {bytes([10]),   # ASCII 10 - new line
 
 
 
+@lru_cache(maxsize=1)
+def quiet_subset_logger() -> None:
+    # set once instead of on every subset, as loggers are shared by all threads
+    import logging
+
+    logging.getLogger("fontTools.subset").setLevel(logging.CRITICAL)
+
+
 class PdfFont:
-    def __init__(self, font_name: str, font_raw_data: bytes) -> None:
+    def __init__(self, font_name: str, font_source: bytes | str | os.PathLike[str]) -> None:
         self.name = font_name
-        self.ttfont = ttLib.TTFont(
-            BytesIO(font_raw_data),
+        self.font_source = font_source
+        # font files given by path are memory-mapped instead of read
+        self._font_file = open_font_source(font_source)
+        # fontTools is imported when the first font is built, not with the package
+        from fontTools import ttLib
+
+        self.ttfont: ttLib.TTFont = ttLib.TTFont(
+            self._font_file,
+            lazy=True,
             recalcTimestamp=False
             )
-        self.cmap = self.ttfont.getBestCmap()
+        self.tables = FontTables(self.ttfont)
         self.cid_counter = 1
+        # cids are the glyph ids of the font instead of counted up
+        self.identity_cids = False
         self.char_code_point_to_cid: dict[int, int] = {}
         self.cid_info: dict[int,       # cid
                             tuple[
                                 int,   # width
                                 int,   # char code point
-                                str,   # glyph name
+                                int,   # glyph id
                                 ]] = {}
-        self.generated_font_name = "MPDFAA+" + \
+        self._subset_glyph_ids: dict[int, int] = {}
+        self._font_file_2_length = 0
+        self._font_file_2_stream: None | bytes = None
+        self._cid_to_gid_stream: None | bytes | bytearray = None
+        self._to_unicode_stream: None | bytes = None
+        self._prepared_stream_key: None | tuple[tuple[int, ...], bool, str] = None
+        self._glyph_tables: None | tuple[np.ndarray, np.ndarray] = None
+        # subset streams shared by clones, keyed by the used code points
+        self.stream_cache: None | dict[
+            tuple[tuple[int, ...], bool, str],
+            tuple[int, bytes, None | bytes | bytearray, dict[int, int]]] = None
+        self._prepare_lock = threading.Lock()
+        # forks share the font file and the parsed tables of this font
+        self._owns_font_file = True
+        self.generated_font_name = DEFAULT_SUBSET_TAG + "+" + \
             re.sub("[ ()]", "", self.ttfont["name"].getBestFullName())  # type: ignore
         self.scale = 1000 / self.ttfont["head"].unitsPerEm  # type: ignore
         self.cap_height = self.get_cap_height()
@@ -60,11 +117,11 @@ class PdfFont:
                          f" {self.ttfont['head'].yMin * self.scale:.0f}"  # type: ignore
                          f" {self.ttfont['head'].xMax * self.scale:.0f}"  # type: ignore
                          f" {self.ttfont['head'].yMax * self.scale:.0f}]")  # type: ignore
-        self.italic_angle = int(self.ttfont["post"].italicAngle)  # type: ignore
+        self.italic_angle = int(self.tables.italic_angle)
         self.stem_v = round(
             50 + int(pow((self.ttfont["OS/2"].usWeightClass / 65), 2)))  # type: ignore
         self.missing_width = round(
-            self.scale * self.ttfont["hmtx"].metrics[".notdef"][0])  # type: ignore
+            self.scale * self.tables.advance_width(NOT_DEFINED))
         self.set_not_defined_unicode_value()
         self.obj_num: None | PdfObj = None
         self.obj_descendant_fonts: None | PdfObj = None
@@ -82,30 +139,53 @@ class PdfFont:
 
     def get_flags(self):
         flags = 0x0000004  # SYMBOLIC
-        if self.ttfont["post"].isFixedPitch:  # type: ignore
+        if self.tables.is_fixed_pitch:
             flags |= 0x0000001  # FIXED_PITCH
-        if self.ttfont["post"].italicAngle != 0:  # type: ignore
+        if self.tables.italic_angle != 0:
             flags |= 0x0000040  # ITALIC
         if self.ttfont["OS/2"].usWeightClass >= 600:  # type: ignore  # noqa: PLR2004
             flags |= 0x0040000  # FORCE_BOLD
         return flags
 
-    def font_subset(self):
-        options = subset.Options(notdef_outline=True, recommended_glyphs=True)
-        options.drop_tables += ["GDEF", "GSUB", "GPOS", "MATH", "hdmx"]
-        logging.getLogger("fontTools.subset").setLevel(logging.CRITICAL)
+    def font_subset(self, embedding_profile: str = "fidelity") -> ttLib.TTFont:
+        from fontTools import subset
+        from fontTools import ttLib
+
+        if embedding_profile not in EMBEDDING_PROFILES:
+            raise ValueError(f"Font embedding profile {embedding_profile} is not defined.")
+        profile_options, profile_drop_tables = EMBEDDING_PROFILES[embedding_profile]
+        options = subset.Options(
+            notdef_outline=True,
+            recommended_glyphs=True,
+            retain_gids=self.identity_cids,
+            **profile_options,
+        )
+        options.drop_tables += ["GDEF", "GSUB", "GPOS", "MATH", "hdmx", *profile_drop_tables]
+        quiet_subset_logger()
         subsetter = subset.Subsetter(options)
-        subsetter.populate(
-            glyphs=[value[2] for value in self.cid_info.values()]
+        # the subset is made from a fresh copy of the font, so this font
+        # keeps all glyphs and can be subsetted again when more are used
+        subset_ttfont = ttLib.TTFont(
+            open_font_source(self.font_source),
+            lazy=True,
+            recalcTimestamp=False
             )
-        subsetter.subset(self.ttfont)
-        self.ttfont.getReverseGlyphMap(rebuild=True)
+        glyph_order = subset_ttfont.getGlyphOrder()
+        glyph_names = {info[2]: glyph_order[info[2]] for info in self.cid_info.values()}
+        subsetter.populate(glyphs=list(glyph_names.values()))
+        subsetter.subset(subset_ttfont)
+        subset_ttfont.getReverseGlyphMap(rebuild=True)
+        self._subset_glyph_ids = {
+            glyph_id: subset_ttfont.getGlyphID(glyph_name)
+            for glyph_id, glyph_name in glyph_names.items()
+            }
+        return subset_ttfont
 
-    def generate_gid_map_in_bytes(self):
+    def generate_gid_map_in_bytes(self) -> bytearray:
         cid_to_gid = {}
         for cid, info in self.cid_info.items():
-            cid_to_gid[cid] = self.ttfont.getGlyphID(
-                info[2]).to_bytes(2, "big")
+            cid_to_gid[cid] = self._subset_glyph_ids[
+                info[2]].to_bytes(2, "big")
         b = bytearray()
         for position in range(MAX_TWO_BYTE_VALUE + 1):
             if position in cid_to_gid:
@@ -116,12 +196,11 @@ class PdfFont:
 
     def set_not_defined_unicode_value(
         self) -> None:
-        glyph_name = ".notdef"
-        glyph_width = self.ttfont["hmtx"].metrics[glyph_name][0]  # type: ignore
+        glyph_width = self.tables.advance_width(NOT_DEFINED)
         self.cid_info[NOT_DEFINED] = (
             round(self.scale * glyph_width + 0.001),
             REPLACEMENT_CHARACTER,
-            glyph_name)
+            NOT_DEFINED)
 
     def get_cid_in_bytes(self, input_string: str) -> bytes | None:
         b = bytearray()
@@ -130,24 +209,68 @@ class PdfFont:
             if char_code_point in {CARRIAGE_RETURN, TAB, NEW_LINE}:
                 return None
             if char_code_point not in self.char_code_point_to_cid:
-                try:
-                    glyph_name = self.cmap[char_code_point]
-                    glyph_width = self.ttfont["hmtx"].metrics[glyph_name][0]  # type: ignore
+                glyph_id = self.tables.glyph_id(char_code_point)
+                if glyph_id == NOT_DEFINED:
+                    # for unicodes not defined in font
+                    self.char_code_point_to_cid[char_code_point] = NOT_DEFINED
+                elif self.identity_cids:
+                    self.char_code_point_to_cid[char_code_point] = glyph_id
+                    # code points sharing a glyph share its cid
+                    self.cid_info.setdefault(
+                        glyph_id,
+                        (round(self.scale * self.tables.advance_width(glyph_id) + 0.001),
+                         char_code_point,
+                         glyph_id))
+                else:
+                    glyph_width = self.tables.advance_width(glyph_id)
                     self.char_code_point_to_cid[char_code_point] = (
                         self.cid_counter)
                     self.cid_info[self.cid_counter] = (
                         round(self.scale * glyph_width + 0.001),
                         char_code_point,
-                        glyph_name)
+                        glyph_id)
                     self._increase_cid()
-                except KeyError:
-                    # for unicodes not defined in font
-                    self.char_code_point_to_cid[char_code_point] = NOT_DEFINED
             b.extend(
                 self.char_code_point_to_cid[char_code_point].to_bytes(2, "big"))
         return bytes(b)
 
 
+    def get_cids_width(self, cid_bytes: bytes | bytearray) -> int:
+        cids = struct.unpack(f">{len(cid_bytes) // 2}H", cid_bytes)
+        return sum(self.cid_info[cid][0] for cid in cids)
+
+    def glyph_tables(self) -> tuple[np.ndarray, np.ndarray]:
+        # dense code point to glyph id and glyph id to /W width tables
+        if self._glyph_tables is None:
+            import numpy as np
+
+            advance_widths = self.tables.advance_width_array()
+            self._glyph_tables = (
+                self.tables.code_point_to_glyph_id_array(),
+                np.round(self.scale * advance_widths + 0.001),
+                )
+        return self._glyph_tables
+
+    def get_text_widths(self, strings: list[str], font_size: float) -> np.ndarray:
+        import numpy as np
+
+        code_point_to_glyph_id, glyph_widths = self.glyph_tables()
+        lengths = np.fromiter(
+            (len(string) for string in strings), dtype=np.int64, count=len(strings))
+        code_points = np.frombuffer(
+            "".join(strings).encode("utf-32-le", "surrogatepass"), dtype="<u4").astype(np.int64)
+        glyph_ids = np.zeros(len(code_points), dtype=np.int64)
+        in_table = code_points < len(code_point_to_glyph_id)
+        glyph_ids[in_table] = code_point_to_glyph_id[code_points[in_table]]
+        glyph_ids[glyph_ids >= len(glyph_widths)] = NOT_DEFINED
+        widths = glyph_widths[glyph_ids]
+        # skipped by get_cid_in_bytes, so they take no space
+        widths[np.isin(code_points, (CARRIAGE_RETURN, TAB, NEW_LINE))] = 0
+        ends = np.cumsum(lengths)
+        totals = np.concatenate(([0.0], np.cumsum(widths)))
+        text_widths: np.ndarray = (totals[ends] - totals[ends - lengths]) * font_size / 1000
+        return text_widths
+
     def _increase_cid(
         self
         ) -> None:
@@ -159,13 +282,46 @@ class PdfFont:
             or byte_value[1].to_bytes(1, "big") in FORBIDDEN_CIDS):
             self._increase_cid()
 
+    def use_identity_cids(self) -> None:
+        # text encoded apart with this font, like in shards, shares one
+        # cid numbering, and the font needs no cid to gid map; cids may
+        # contain bytes that are escaped in literal strings
+        if len(self.cid_info) > 1:
+            raise ValueError("Cids of the font are already allocated.")
+        self.identity_cids = True
+
+    def add_code_points(self, code_points: Iterable[int]) -> None:
+        # cids are allocated in the given order, as if the text was encoded
+        self.get_cid_in_bytes("".join(chr(code_point) for code_point in code_points))
+
+    def used_code_points(self) -> tuple[int, ...]:
+        # in cid order, so add_code_points recreates the same cids
+        return tuple(info[1] for cid, info in self.cid_info.items() if cid != NOT_DEFINED)
+
+    def glyph_count(self) -> int:
+        return len(self.cid_info)
+
+    def source_fingerprint(self) -> bytes | bytearray | tuple[str, int, int]:
+        # font data is hashed in place, it is not copied
+        if isinstance(self.font_source, bytes | bytearray):
+            return self.font_source
+        stat = os.stat(self.font_source)
+        return (os.fspath(self.font_source), stat.st_size, stat.st_mtime_ns)
+
+    def close(self) -> None:
+        if not self._owns_font_file:
+            return
+        self.ttfont.close()
+        self._font_file.close()
+
     def generate_pdf_obj(self, collector: Collector):
         self.obj_num = collector.new_obj()
         self.obj_descendant_fonts = collector.new_obj()
         self.obj_to_unicode = collector.new_obj()
         self.obj_font_descriptor = collector.new_obj()
         self.obj_font_file_2 = collector.new_obj()
-        self.obj_cid_to_gid = collector.new_obj()
+        if not self.identity_cids:
+            self.obj_cid_to_gid = collector.new_obj()
 
     def _font_obj_build(self) -> None:
         if self.obj_num is None:
@@ -205,10 +361,14 @@ class PdfFont:
         self.obj_descendant_fonts.set_attribute_value(
             "/FontDescriptor",
             self.obj_font_descriptor)
-        if self.obj_cid_to_gid is None:
+        if self.identity_cids:
+            # glyph ids are kept by the subset, so cids map to themselves
+            self.obj_descendant_fonts.set_attribute_value("/CIDToGIDMap", "/Identity")
+        elif self.obj_cid_to_gid is None:
             raise ValueError("Cid to Gid object is missing.")
-        self.obj_descendant_fonts.set_attribute_value(
-            "/CIDToGIDMap", self.obj_cid_to_gid)
+        else:
+            self.obj_descendant_fonts.set_attribute_value(
+                "/CIDToGIDMap", self.obj_cid_to_gid)
         cid_widths = []
         for cid, info in self.cid_info.items():
             cid_widths.append(f"{cid} {cid} {info[0]}")
@@ -241,65 +401,163 @@ class PdfFont:
             "/FontFile2",
             self.obj_font_file_2)
 
+    def clone(self) -> PdfFont:
+        # the clone continues the cid numbering of this font, so content
+        # already encoded with this font stays valid for the clone, and
+        # shares the parsed font like a fork
+        font = self.fork()
+        font.cid_counter = self.cid_counter
+        font.char_code_point_to_cid = dict(self.char_code_point_to_cid)
+        font.cid_info = dict(self.cid_info)
+        font.stream_cache = self.stream_cache
+        return font
+
+    def fork(self) -> PdfFont:
+        # the fork starts its own cid numbering without parsing the font
+        # again, so it is subsetted only with the glyphs it encodes
+        font = copy.copy(self)
+        font._owns_font_file = False
+        font.cid_counter = 1
+        font.char_code_point_to_cid = {}
+        font.cid_info = {}
+        font.set_not_defined_unicode_value()
+        font._subset_glyph_ids = {}
+        font._font_file_2_length = 0
+        font._font_file_2_stream = None
+        font._cid_to_gid_stream = None
+        font._to_unicode_stream = None
+        font._prepared_stream_key = None
+        font.stream_cache = None
+        font._prepare_lock = threading.Lock()
+        font.obj_num = None
+        font.obj_descendant_fonts = None
+        font.obj_to_unicode = None
+        font.obj_font_descriptor = None
+        font.obj_font_file_2 = None
+        font.obj_cid_to_gid = None
+        return font
+
+    def prepare_streams(
+        self,
+        should_compress: bool,
+        embedding_profile: str = "fidelity",
+        compressed_stream_cache: None | CompressedStreamCache = None,
+    ) -> None:
+        # subsetting, saving and compressing do not touch the collector
+        # objects, so they can run on a background worker
+        with self._prepare_lock:
+            stream_key = (
+                tuple(info[1] for info in self.cid_info.values()),
+                should_compress,
+                embedding_profile,
+            )
+            if stream_key == self._prepared_stream_key:
+                return
+            if self.stream_cache is not None and stream_key in self.stream_cache:
+                streams = self.stream_cache[stream_key]
+            else:
+                streams = self._subset_streams(should_compress, embedding_profile, compressed_stream_cache)
+                if self.stream_cache is not None and len(self.stream_cache) < MAX_STREAM_CACHE_ENTRIES:
+                    self.stream_cache[stream_key] = streams
+            (
+                self._font_file_2_length,
+                self._font_file_2_stream,
+                self._cid_to_gid_stream,
+                self._subset_glyph_ids,
+            ) = streams
+            to_unicode = self._to_unicode_bytes()
+            if should_compress:
+                self._to_unicode_stream = compress_chunks([to_unicode], compressed_stream_cache)
+            else:
+                self._to_unicode_stream = to_unicode
+            self._prepared_stream_key = stream_key
+
+    def _subset_streams(
+        self,
+        should_compress: bool,
+        embedding_profile: str,
+        compressed_stream_cache: None | CompressedStreamCache,
+    ) -> tuple[int, bytes, None | bytes | bytearray, dict[int, int]]:
+        # font file length, font file, cid to gid map and subset glyph ids
+        subset_ttfont = self.font_subset(embedding_profile)
+        ttfont_bytesio = BytesIO()
+        subset_ttfont.save(ttfont_bytesio)
+        subset_ttfont.close()
+        ttfont_bytes = ttfont_bytesio.getvalue()
+        font_file_2_stream = ttfont_bytes
+        if should_compress:
+            font_file_2_stream = compress_chunks([ttfont_bytes], compressed_stream_cache)
+        if self.identity_cids:
+            return len(ttfont_bytes), font_file_2_stream, None, self._subset_glyph_ids
+        gid_map_in_bytes: bytes | bytearray = self.generate_gid_map_in_bytes()
+        if should_compress:
+            gid_map_in_bytes = compress_chunks([gid_map_in_bytes], compressed_stream_cache)
+        return len(ttfont_bytes), font_file_2_stream, gid_map_in_bytes, self._subset_glyph_ids
+
     def _font_file_2_build(self, should_compress: bool) -> None:
         if self.obj_font_file_2 is None:
             raise ValueError("Font descriptor object is missing.")
-        self.font_subset()
-        ttfont_bytesio = BytesIO()
-        self.ttfont.save(ttfont_bytesio)
-        ttfont_bytes = ttfont_bytesio.getvalue()
-        ttfont_size = len(ttfont_bytes)
-        self.obj_font_file_2.set_attribute_value("/Length1", ttfont_size)
+        if self._font_file_2_stream is None:
+            raise ValueError("Font file 2 stream is not prepared.")
+        self.obj_font_file_2.set_attribute_value("/Length1", self._font_file_2_length)
         if should_compress:
             self.obj_font_file_2.set_attribute_value("/Filter", "/FlateDecode")
-            self.obj_font_file_2.extend_stream(zlib.compress(ttfont_bytes))
-        else:
-            self.obj_font_file_2.extend_stream(ttfont_bytes)
+        self.obj_font_file_2.extend_stream(self._font_file_2_stream)
 
     def _cid_to_gid_map_build(self, should_compress: bool) -> None:
         if self.obj_cid_to_gid is None:
             raise ValueError("Cid to Gid object is missing.")
-        gid_map_in_bytes = self.generate_gid_map_in_bytes()
+        if self._cid_to_gid_stream is None:
+            raise ValueError("Cid to Gid stream is not prepared.")
         if should_compress:
             self.obj_cid_to_gid.set_attribute_value("/Filter", "/FlateDecode")
-            self.obj_cid_to_gid.extend_stream(zlib.compress(gid_map_in_bytes))
-        else:
-            self.obj_cid_to_gid.extend_stream(gid_map_in_bytes)
+        self.obj_cid_to_gid.extend_stream(self._cid_to_gid_stream)
+
+    def _to_unicode_bytes(self) -> bytes:
+        lines = [
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo",
+            "<</Registry (Adobe)",
+            "/Ordering (UCS)",
+            "/Supplement 0",
+            ">> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+            f"{len(self.cid_info)} beginbfchar",
+            *(f"<{cid:04X}> <{info[1]:04X}>" for cid, info in self.cid_info.items()),
+            "endbfchar",
+            "endcmap",
+            "CMapName currentdict /CMap defineresource pop",
+            "end",
+            "end",
+        ]
+        return "\n".join(lines).encode("ascii") + b"\n"
 
-    def _to_unicode_build(self) -> None:
+    def _to_unicode_build(self, should_compress: bool) -> None:
         if self.obj_to_unicode is None:
             raise ValueError("To Unicode object is missing.")
-        self.obj_to_unicode.extend_stream(
-            "/CIDInit /ProcSet findresource begin")
-        self.obj_to_unicode.extend_stream("12 dict begin")
-        self.obj_to_unicode.extend_stream("begincmap")
-        self.obj_to_unicode.extend_stream("/CIDSystemInfo")
-        self.obj_to_unicode.extend_stream("<</Registry (Adobe)")
-        self.obj_to_unicode.extend_stream("/Ordering (UCS)")
-        self.obj_to_unicode.extend_stream("/Supplement 0")
-        self.obj_to_unicode.extend_stream(">> def")
-        self.obj_to_unicode.extend_stream("/CMapName /Adobe-Identity-UCS def")
-        self.obj_to_unicode.extend_stream("/CMapType 2 def")
-        self.obj_to_unicode.extend_stream("1 begincodespacerange")
-        self.obj_to_unicode.extend_stream("<0000> <FFFF>")
-        self.obj_to_unicode.extend_stream("endcodespacerange")
-        self.obj_to_unicode.extend_stream(
-            f"{len(self.cid_info)} beginbfchar")
-        for cid, info in self.cid_info.items():
-            self.obj_to_unicode.extend_stream(f"<{cid:04X}> <{info[1]:04X}>")
-        self.obj_to_unicode.extend_stream("endbfchar")
-        self.obj_to_unicode.extend_stream("endcmap")
-        self.obj_to_unicode.extend_stream(
-            "CMapName currentdict /CMap defineresource pop")
-        self.obj_to_unicode.extend_stream("end")
-        self.obj_to_unicode.extend_stream("end")
+        if self._to_unicode_stream is None:
+            raise ValueError("To Unicode stream is not prepared.")
+        if should_compress:
+            self.obj_to_unicode.set_attribute_value("/Filter", "/FlateDecode")
+        self.obj_to_unicode.extend_stream(self._to_unicode_stream)
 
 
     def build(self,
-              should_compress: bool):
+              should_compress: bool,
+              embedding_profile: str = "fidelity",
+              compressed_stream_cache: None | CompressedStreamCache = None):
+        # streams are prepared again only when more glyphs were used
+        self.prepare_streams(should_compress, embedding_profile, compressed_stream_cache)
         self._font_obj_build()
         self._descendant_fonts_obj_build()
         self._font_descriptor_obj_build()
         self._font_file_2_build(should_compress)
-        self._cid_to_gid_map_build(should_compress)
-        self._to_unicode_build()
+        if not self.identity_cids:
+            self._cid_to_gid_map_build(should_compress)
+        self._to_unicode_build(should_compress)
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    import numpy as np
+    from fontTools import ttLib
+
+
+# same preference order as fontTools getBestCmap
+CMAP_PREFERENCES = ((3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0))
+CMAP_SEGMENT_MAPPING = 4
+CMAP_SEGMENTED_COVERAGE = 12
+MAX_BMP_CODE_POINT = 0xFFFF
+MAX_CODE_POINT = 0x10FFFF
+POST_HEADER = struct.Struct(">llhhL")
+
+
+def open_font_source(font_source: bytes | str | os.PathLike[str]) -> BytesIO | mmap.mmap:
+    if isinstance(font_source, bytes | bytearray):
+        return BytesIO(font_source)
+    with open(font_source, "rb") as font_file:
+        return mmap.mmap(font_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_big_endian_array(typecode: str, data: bytes, start: int, count: int) -> array[int]:
+    values = array(typecode)
+    values.frombytes(data[start : start + count * values.itemsize])
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+
+class FontTables:
+    """Reads cmap, hmtx and post values straight from the raw font tables.
+
+    Only the entries that are looked up are decoded, so the cmap and hmtx of
+    a large font are never decompiled into fontTools objects.
+    """
+
+    def __init__(self, ttfont: ttLib.TTFont) -> None:
+        self._ttfont = ttfont
+        self._cmap_data = ttfont.reader["cmap"]
+        self._hmtx_data = ttfont.reader["hmtx"]
+        self._num_of_hmetrics: int = ttfont["hhea"].numberOfHMetrics
+        # read here, so the font is not touched after parsing and can be
+        # shared by fonts used on other threads
+        self._num_of_glyphs: int = ttfont["maxp"].numGlyphs
+        self._cmap_format = 0
+        self._cmap_offset = 0
+        self._cmap_fallback: None | dict[int, int] = None
+        self._seg_end_codes = array("H")
+        self._group_end_codes = array("I")
+        self._select_cmap_subtable()
+        (
+            _,
+            italic_angle,
+            _,
+            _,
+            is_fixed_pitch,
+        ) = POST_HEADER.unpack_from(ttfont.reader["post"])
+        self.italic_angle: float = italic_angle / 65536
+        self.is_fixed_pitch = is_fixed_pitch != 0
+
+    def _select_cmap_subtable(self) -> None:
+        data = self._cmap_data
+        num_of_tables = struct.unpack_from(">H", data, 2)[0]
+        subtables: dict[tuple[int, int], int] = {}
+        for index in range(num_of_tables):
+            platform_id, encoding_id, offset = struct.unpack_from(">HHL", data, 4 + index * 8)
+            subtables.setdefault((platform_id, encoding_id), offset)
+        for preference in CMAP_PREFERENCES:
+            if preference not in subtables:
+                continue
+            offset = subtables[preference]
+            cmap_format = struct.unpack_from(">H", data, offset)[0]
+            if cmap_format == CMAP_SEGMENT_MAPPING:
+                seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+                self._seg_end_codes = read_big_endian_array("H", data, offset + 14, seg_count)
+            elif cmap_format == CMAP_SEGMENTED_COVERAGE:
+                num_of_groups = struct.unpack_from(">L", data, offset + 12)[0]
+                groups = read_big_endian_array("I", data, offset + 16, num_of_groups * 3)
+                self._group_end_codes = groups[1::3]
+            else:
+                break
+            self._cmap_format = cmap_format
+            self._cmap_offset = offset
+            return
+        # uncommon subtable formats are decompiled by fontTools
+        reverse_glyph_map = self._ttfont.getReverseGlyphMap()
+        best_cmap = self._ttfont.getBestCmap() or {}
+        self._cmap_fallback = {
+            code_point: reverse_glyph_map[glyph_name] for code_point, glyph_name in best_cmap.items()
+        }
+
+    def glyph_id(self, char_code_point: int) -> int:
+        if self._cmap_fallback is not None:
+            return self._cmap_fallback.get(char_code_point, 0)
+        if self._cmap_format == CMAP_SEGMENT_MAPPING:
+            return self._segment_mapping_glyph_id(char_code_point)
+        return self._segmented_coverage_glyph_id(char_code_point)
+
+    def _segment_mapping_glyph_id(self, char_code_point: int) -> int:
+        if char_code_point > MAX_BMP_CODE_POINT:
+            return 0
+        data = self._cmap_data
+        seg_count = len(self._seg_end_codes)
+        segment = bisect_left(self._seg_end_codes, char_code_point)
+        if segment == seg_count:
+            return 0
+        start_codes = self._cmap_offset + 16 + seg_count * 2
+        id_deltas = start_codes + seg_count * 2
+        id_range_offsets = id_deltas + seg_count * 2
+        start_code = struct.unpack_from(">H", data, start_codes + segment * 2)[0]
+        if char_code_point < start_code:
+            return 0
+        id_delta: int = struct.unpack_from(">h", data, id_deltas + segment * 2)[0]
+        id_range_offset_position = id_range_offsets + segment * 2
+        id_range_offset = struct.unpack_from(">H", data, id_range_offset_position)[0]
+        if id_range_offset == 0:
+            return (char_code_point + id_delta) & 0xFFFF
+        glyph_position = id_range_offset_position + id_range_offset + (char_code_point - start_code) * 2
+        glyph_id: int = struct.unpack_from(">H", data, glyph_position)[0]
+        if glyph_id == 0:
+            return 0
+        return (glyph_id + id_delta) & 0xFFFF
+
+    def _segmented_coverage_glyph_id(self, char_code_point: int) -> int:
+        group = bisect_left(self._group_end_codes, char_code_point)
+        if group == len(self._group_end_codes):
+            return 0
+        start_char_code: int
+        start_glyph_id: int
+        start_char_code, _, start_glyph_id = struct.unpack_from(
+            ">LLL", self._cmap_data, self._cmap_offset + 16 + group * 12
+        )
+        if char_code_point < start_char_code:
+            return 0
+        return start_glyph_id + char_code_point - start_char_code
+
+    def advance_width(self, glyph_id: int) -> int:
+        if glyph_id >= self._num_of_hmetrics:
+            glyph_id = self._num_of_hmetrics - 1
+        advance_width: int = struct.unpack_from(">H", self._hmtx_data, glyph_id * 4)[0]
+        return advance_width
+
+    def code_point_to_glyph_id_array(self) -> np.ndarray:
+        import numpy as np
+
+        data = self._cmap_data
+        if self._cmap_fallback is not None:
+            size = max(self._cmap_fallback, default=0) + 1
+            table = np.zeros(size, dtype=np.uint16)
+            table[list(self._cmap_fallback)] = list(self._cmap_fallback.values())
+            return table
+        if self._cmap_format == CMAP_SEGMENT_MAPPING:
+            table = np.zeros(MAX_BMP_CODE_POINT + 1, dtype=np.uint16)
+            seg_count = len(self._seg_end_codes)
+            start_codes = self._cmap_offset + 16 + seg_count * 2
+            id_deltas = start_codes + seg_count * 2
+            id_range_offsets = id_deltas + seg_count * 2
+            for segment, end_code in enumerate(self._seg_end_codes):
+                start_code = struct.unpack_from(">H", data, start_codes + segment * 2)[0]
+                if start_code > end_code:
+                    continue
+                id_delta = struct.unpack_from(">h", data, id_deltas + segment * 2)[0]
+                id_range_offset_position = id_range_offsets + segment * 2
+                id_range_offset = struct.unpack_from(">H", data, id_range_offset_position)[0]
+                if id_range_offset == 0:
+                    code_points = np.arange(start_code, end_code + 1, dtype=np.int64)
+                    table[start_code : end_code + 1] = (code_points + id_delta) & 0xFFFF
+                    continue
+                glyph_ids = np.frombuffer(
+                    data,
+                    dtype=">u2",
+                    count=end_code - start_code + 1,
+                    offset=id_range_offset_position + id_range_offset,
+                ).astype(np.int64)
+                table[start_code : end_code + 1] = np.where(glyph_ids == 0, 0, (glyph_ids + id_delta) & 0xFFFF)
+            return table
+        num_of_groups = len(self._group_end_codes)
+        groups = np.frombuffer(data, dtype=">u4", count=num_of_groups * 3, offset=self._cmap_offset + 16)
+        groups = groups.reshape(num_of_groups, 3).astype(np.int64)
+        groups = groups[groups[:, 0] <= MAX_CODE_POINT]
+        groups[:, 1] = np.minimum(groups[:, 1], MAX_CODE_POINT)
+        table = np.zeros(int(groups[:, 1].max(initial=0)) + 1, dtype=np.uint16)
+        # expand all groups at once instead of filling them one by one
+        lengths = groups[:, 1] - groups[:, 0] + 1
+        positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        code_points = np.repeat(groups[:, 0], lengths) + positions
+        table[code_points] = np.repeat(groups[:, 2], lengths) + positions
+        return table
+
+    def advance_width_array(self) -> np.ndarray:
+        import numpy as np
+
+        num_of_glyphs = self._num_of_glyphs
+        hmetrics = np.frombuffer(self._hmtx_data, dtype=">u2", count=self._num_of_hmetrics * 2)
+        advance_widths = np.empty(max(num_of_glyphs, self._num_of_hmetrics), dtype=np.float64)
+        advance_widths[: self._num_of_hmetrics] = hmetrics[0::2]
+        advance_widths[self._num_of_hmetrics :] = hmetrics[-2]
+        return advance_widths
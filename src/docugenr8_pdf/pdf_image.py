@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import hashlib
+import struct
+
+from .core import Collector
+from .core import PdfObj
+
+
+JPEG_SIGNATURE = b"\xff\xd8"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# start of frame markers, all but DHT (C4), JPG (C8) and DAC (CC)
+JPEG_START_OF_FRAME = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# markers without a length field
+JPEG_STANDALONE = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8, 0xD9}
+JPEG_APP14 = 0xEE
+JPEG_START_OF_SCAN = 0xDA
+JPEG_COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+# DCTDecode supports only baseline precision
+JPEG_BITS_PER_COMPONENT = 8
+PNG_GRAYSCALE = 0
+PNG_TRUECOLOR = 2
+PNG_INDEXED = 3
+PNG_COLORS = {PNG_GRAYSCALE: 1, PNG_TRUECOLOR: 3, PNG_INDEXED: 1}
+MAX_BITS_PER_COMPONENT = 8
+
+
+def png_color_space(color_type: int, palette: None | memoryview) -> str:
+    if color_type == PNG_GRAYSCALE:
+        return "/DeviceGray"
+    if color_type == PNG_TRUECOLOR:
+        return "/DeviceRGB"
+    if palette is None:
+        raise ValueError("PNG palette not found.")
+    return f"[/Indexed /DeviceRGB {len(palette) // 3 - 1} <{bytes(palette).hex()}>]"
+
+
+def png_color_key_mask(color_type: int, transparency: memoryview) -> str:
+    # tRNS gives one transparent gray or rgb value, or an alpha per palette entry
+    if color_type in {PNG_GRAYSCALE, PNG_TRUECOLOR}:
+        values = struct.unpack(f">{len(transparency) // 2}H", transparency)
+        return f"[{' '.join(f'{value} {value}' for value in values)}]"
+    transparent = [index for index, alpha in enumerate(transparency) if alpha == 0]
+    # a color key mask has one range of indexes and no partial transparency
+    if (
+        any(alpha not in {0, 255} for alpha in transparency)
+        or len(transparent) == 0
+        or transparent != list(range(transparent[0], transparent[-1] + 1))
+    ):
+        raise ValueError("Only PNG palettes with one range of fully transparent entries are supported.")
+    return f"[{transparent[0]} {transparent[-1]}]"
+
+
+class PdfImage:
+    """Raster image embedded as an image XObject.
+
+    JPEG data is embedded as it is with DCTDecode, and the compressed data
+    of PNG images is passed through with Flate predictors, so the image
+    data is never decoded. It is copied only when given in a mutable
+    buffer, so the image cannot change after its digest is taken.
+    """
+
+    def __init__(self, data: bytes | bytearray | memoryview) -> None:
+        view = memoryview(data).cast("B")
+        self.data = view if view.readonly else memoryview(bytes(view))
+        # identical images are embedded once per document
+        self.digest = hashlib.sha256(self.data).hexdigest()
+        self.width = 0
+        self.height = 0
+        self.attributes: dict[str, str | int | dict[str, object]] = {}
+        self._segments: list[memoryview] = []
+        if self.data[:2] == JPEG_SIGNATURE:
+            self._read_jpeg()
+        elif self.data[:8] == PNG_SIGNATURE:
+            self._read_png()
+        else:
+            raise ValueError("Only JPEG and PNG images are supported.")
+
+    def _read_jpeg(self) -> None:
+        data = self.data
+        position = 2
+        components = 0
+        is_adobe = False
+        while position + 4 <= len(data):
+            if data[position] != 0xFF:
+                raise ValueError("JPEG marker not found.")
+            marker = data[position + 1]
+            if marker == 0xFF:
+                # fill byte before a marker
+                position += 1
+                continue
+            if marker in JPEG_STANDALONE:
+                position += 2
+                continue
+            length = struct.unpack_from(">H", data, position + 2)[0]
+            if marker in JPEG_START_OF_FRAME:
+                components = self._read_jpeg_frame(position)
+            elif marker == JPEG_APP14 and bytes(data[position + 4 : position + 9]) == b"Adobe":
+                is_adobe = True
+            elif marker == JPEG_START_OF_SCAN:
+                break
+            position += 2 + length
+        if components not in JPEG_COLOR_SPACES or self.width == 0 or self.height == 0:
+            raise ValueError("JPEG frame header not found or not supported.")
+        self.attributes["/ColorSpace"] = JPEG_COLOR_SPACES[components]
+        if components == 4 and is_adobe:
+            # Adobe applications write inverted CMYK values
+            self.attributes["/Decode"] = "[1 0 1 0 1 0 1 0]"
+        self.attributes["/Filter"] = "/DCTDecode"
+        self._segments = [data]
+
+    def _read_jpeg_frame(self, position: int) -> int:
+        bits, self.height, self.width, components = struct.unpack_from(">BHHB", self.data, position + 4)
+        if bits != JPEG_BITS_PER_COMPONENT:
+            raise ValueError("Only JPEG images with 8 bits per component are supported.")
+        self.attributes["/BitsPerComponent"] = bits
+        return int(components)
+
+    def _read_png(self) -> None:
+        data = self.data
+        position = len(PNG_SIGNATURE)
+        color_type = 0
+        palette: None | memoryview = None
+        transparency: None | memoryview = None
+        while position + 8 <= len(data):
+            length, chunk_type = struct.unpack_from(">L4s", data, position)
+            chunk = data[position + 8 : position + 8 + length]
+            if chunk_type == b"IHDR":
+                color_type = self._read_png_header(chunk)
+            elif chunk_type == b"PLTE":
+                palette = chunk
+            elif chunk_type == b"tRNS":
+                transparency = chunk
+            elif chunk_type == b"IDAT":
+                # the zlib stream may be split into several chunks
+                self._segments.append(chunk)
+            elif chunk_type == b"IEND":
+                break
+            position += 12 + length
+        if self.width == 0 or len(self._segments) == 0:
+            raise ValueError("PNG image data not found.")
+        self.attributes["/ColorSpace"] = png_color_space(color_type, palette)
+        if transparency is not None:
+            # transparent color is masked out, as the image has no alpha channel
+            self.attributes["/Mask"] = png_color_key_mask(color_type, transparency)
+        self.attributes["/Filter"] = "/FlateDecode"
+        # rows keep the PNG filter type byte, which predictor 15 reads
+        self.attributes["/DecodeParms"] = {
+            "/Predictor": 15,
+            "/Colors": PNG_COLORS[color_type],
+            "/BitsPerComponent": self.attributes["/BitsPerComponent"],
+            "/Columns": self.width,
+        }
+
+    def _read_png_header(self, chunk: memoryview) -> int:
+        (
+            self.width,
+            self.height,
+            bits,
+            color_type,
+            _,
+            _,
+            interlace,
+        ) = struct.unpack_from(">LLBBBBB", chunk)
+        if color_type not in PNG_COLORS or bits > MAX_BITS_PER_COMPONENT:
+            raise ValueError(
+                "Only grayscale, truecolor and indexed PNG images without alpha channel and up to 8 bits are supported."
+            )
+        if interlace != 0:
+            raise ValueError("Interlaced PNG images are not supported.")
+        self.attributes["/BitsPerComponent"] = bits
+        return int(color_type)
+
+    def generate_pdf_obj(self, collector: Collector) -> PdfObj:
+        image_obj = collector.new_obj("/XObject")
+        image_obj.set_attribute_value("/Subtype", "/Image")
+        image_obj.set_attribute_value("/Width", self.width)
+        image_obj.set_attribute_value("/Height", self.height)
+        for attribute, value in self.attributes.items():
+            image_obj.set_attribute_value(attribute, value)
+        for segment in self._segments:
+            image_obj.extend_stream(segment)
+        return image_obj
@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import itertools
+import zlib
+
+from .core import Collector
+from .core import PdfObj
+from .core import generate_id
+from .core import iter_references
+
+
+# numbers written before their final value is known reserve this many digits
+MAX_RESERVED_NUMBER = 9999999999
+
+
+class BitWriter:
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self._value = 0
+        self._bits = 0
+
+    def write(self, value: int, bits: int) -> None:
+        self._value = (self._value << bits) | value
+        self._bits += bits
+        while self._bits >= 8:
+            self._bits -= 8
+            self.buffer.append((self._value >> self._bits) & 0xFF)
+        self._value &= (1 << self._bits) - 1
+
+    def write_all(self, values: list[int], bits: int) -> None:
+        for value in values:
+            self.write(value, bits)
+        self.align()
+
+    def align(self) -> None:
+        if self._bits > 0:
+            self.buffer.append((self._value << (8 - self._bits)) & 0xFF)
+        self._value = 0
+        self._bits = 0
+
+
+class Linearizer:
+    """Serializes collector objects as a linearized (Fast Web View) file.
+
+    The layout follows Annex F of the PDF specification: linearization
+    dictionary, first-page cross-reference table, catalog, primary hint
+    stream and the first page section come first, followed by the remaining
+    pages, the objects they share, all other objects and the main
+    cross-reference table.
+    """
+
+    def __init__(
+        self,
+        collector: Collector,
+        page_objs: list[PdfObj],
+        should_compress: bool,
+    ) -> None:
+        if len(page_objs) == 0:
+            raise ValueError("Linearized output requires at least one page.")
+        self._collector = collector
+        self._page_objs = page_objs
+        self._should_compress = should_compress
+
+    def _page_closure(self, page_obj: PdfObj) -> list[PdfObj]:
+        # every object the page needs, starting with the page object itself
+        closure = [page_obj]
+        visited = {page_obj}
+        index = 0
+        while index < len(closure):
+            obj = closure[index]
+            index += 1
+            for attribute, value in obj.attributes.items():
+                if attribute == "/Parent":
+                    continue
+                for reference in iter_references(value):
+                    if reference not in visited:
+                        visited.add(reference)
+                        closure.append(reference)
+        return closure
+
+    def build_segments(self) -> list[bytes | bytearray | memoryview]:
+        closures = [self._page_closure(page_obj) for page_obj in self._page_objs]
+        first_page = closures[0]
+        first_page_set = set(first_page)
+        page_users: dict[PdfObj, int] = {}
+        for closure in closures[1:]:
+            for obj in closure:
+                if obj not in first_page_set:
+                    page_users[obj] = page_users.get(obj, 0) + 1
+        other_pages = [
+            [obj for obj in closure if obj not in first_page_set and page_users[obj] == 1] for closure in closures[1:]
+        ]
+        shared = [obj for obj, users in page_users.items() if users > 1]
+        catalog = self._collector.catalog_obj
+        placed = first_page_set | set(page_users) | {catalog}
+        others = [obj for obj in self._collector.objects if obj not in placed]
+        main_objects = [obj for page in other_pages for obj in page] + shared + others
+        original_numbers = {obj: obj.obj_num for obj in [catalog, *first_page, *main_objects]}
+        # the main cross-reference section holds objects 1..n, the first
+        # page section is numbered after it
+        for obj_num, obj in enumerate(main_objects, 1):
+            obj.obj_num = obj_num
+        first_section_num = len(main_objects) + 1
+        catalog.obj_num = first_section_num + 1
+        hint_obj = PdfObj(first_section_num + 2)
+        for obj_num, obj in enumerate(first_page, first_section_num + 3):
+            obj.obj_num = obj_num
+        try:
+            return self._layout(closures, other_pages, shared, main_objects, hint_obj)
+        finally:
+            for obj, obj_num in original_numbers.items():
+                obj.obj_num = obj_num
+
+    def _layout(
+        self,
+        closures: list[list[PdfObj]],
+        other_pages: list[list[PdfObj]],
+        shared: list[PdfObj],
+        main_objects: list[PdfObj],
+        hint_obj: PdfObj,
+    ) -> list[bytes | bytearray | memoryview]:
+        first_page = closures[0]
+        catalog = self._collector.catalog_obj
+        header = self._collector.build_header()
+        linearization_num = catalog.obj_num - 1
+        catalog_segments = catalog.build_segments()
+        first_page_segments = [obj.build_segments() for obj in first_page]
+        main_segments = [obj.build_segments() for obj in main_objects]
+        document_id = self._collector.document_id
+        if document_id is None:
+            document_id = generate_id(itertools.chain(catalog_segments, *first_page_segments, *main_segments))
+        num_of_objects = catalog.obj_num + 2 + len(first_page)
+        reserved = (MAX_RESERVED_NUMBER,) * 7
+        linearization_length = len(self._linearization_dict(linearization_num, *reserved)) + len(b" >>\nendobj\n")
+        first_xref_offset = len(header) + linearization_length
+        first_trailer_length = len(
+            self._first_trailer(num_of_objects, catalog.obj_num, document_id, MAX_RESERVED_NUMBER, None)
+        )
+        first_xref_length = len(self._xref(linearization_num, [0] * (len(first_page) + 3)))
+        catalog_offset = first_xref_offset + first_xref_length + first_trailer_length
+        hint_offset = catalog_offset + segments_length(catalog_segments)
+        # hint tables record offsets as if the hint stream were absent
+        lengths = {}
+        adjusted_offsets = {}
+        offset = hint_offset
+        for obj, obj_segments in zip([*first_page, *main_objects], [*first_page_segments, *main_segments], strict=True):
+            adjusted_offsets[obj] = offset
+            lengths[obj] = segments_length(obj_segments)
+            offset += lengths[obj]
+        hint_stream, shared_table_offset = self._hint_tables(closures, other_pages, shared, adjusted_offsets, lengths)
+        hint_obj.set_attribute_value("/S", shared_table_offset)
+        if self._should_compress:
+            hint_obj.set_attribute_value("/Filter", "/FlateDecode")
+            hint_obj.extend_stream(zlib.compress(hint_stream))
+        else:
+            hint_obj.extend_stream(hint_stream)
+        hint_segments = hint_obj.build_segments()
+        hint_length = segments_length(hint_segments)
+        offsets = {obj: obj_offset + hint_length for obj, obj_offset in adjusted_offsets.items()}
+        end_of_first_page = hint_offset + hint_length + sum(lengths[obj] for obj in first_page)
+        main_xref_offset = offset + hint_length
+        main_xref = self._xref(0, [0] + [offsets[obj] for obj in main_objects])
+        main_trailer = b"trailer\n<< /Size %d /ID [%b] >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(main_objects) + 1,
+            document_id,
+            first_xref_offset,
+        )
+        file_length = main_xref_offset + len(main_xref) + len(main_trailer)
+        linearization_dict = self._linearization_dict(
+            linearization_num,
+            file_length,
+            hint_offset,
+            hint_length,
+            first_page[0].obj_num,
+            end_of_first_page,
+            len(self._page_objs),
+            main_xref_offset + len(b"xref\n0 %d\n" % (len(main_objects) + 1)) - 1,
+        )
+        first_xref = self._xref(
+            linearization_num,
+            [len(header), catalog_offset, hint_offset] + [offsets[obj] for obj in first_page],
+        )
+        first_trailer = self._first_trailer(
+            num_of_objects, catalog.obj_num, document_id, main_xref_offset, first_trailer_length
+        )
+        segments: list[bytes | bytearray | memoryview] = [
+            header,
+            pad(linearization_dict, linearization_length - len(b" >>\nendobj\n")) + b" >>\nendobj\n",
+            first_xref,
+            first_trailer,
+        ]
+        for obj_segments in [catalog_segments, hint_segments, *first_page_segments, *main_segments]:
+            segments.extend(obj_segments)
+        segments.extend((main_xref, main_trailer))
+        return segments
+
+    def _hint_tables(
+        self,
+        closures: list[list[PdfObj]],
+        other_pages: list[list[PdfObj]],
+        shared: list[PdfObj],
+        offsets: dict[PdfObj, int],
+        lengths: dict[PdfObj, int],
+    ) -> tuple[bytearray, int]:
+        first_page = closures[0]
+        shared_identifiers = {obj: index for index, obj in enumerate([*first_page, *shared])}
+        pages = [first_page, *other_pages]
+        num_of_objects = [len(page) for page in pages]
+        page_lengths = [sum(lengths[obj] for obj in page) for page in pages]
+        page_shared: list[list[int]] = [[]]
+        for closure, page in zip(closures[1:], other_pages, strict=True):
+            page_objects = set(page)
+            page_shared.append([shared_identifiers[obj] for obj in closure if obj not in page_objects])
+        content_offsets = []
+        content_lengths = []
+        for page in pages:
+            contents = page[0].get_attribute_value("/Contents")
+            if isinstance(contents, list):
+                contents = contents[0]
+            if isinstance(contents, PdfObj) and contents in page:
+                content_offsets.append(offsets[contents] - offsets[page[0]])
+                content_lengths.append(lengths[contents])
+            else:
+                content_offsets.append(0)
+                content_lengths.append(0)
+        max_shared = max(len(identifiers) for identifiers in page_shared)
+        max_identifier = max((max(identifiers, default=0) for identifiers in page_shared), default=0)
+        # page offset hint table
+        writer = BitWriter()
+        writer.write(min(num_of_objects), 32)
+        writer.write(offsets[first_page[0]], 32)
+        writer.write(delta_bits(num_of_objects), 16)
+        writer.write(min(page_lengths), 32)
+        writer.write(delta_bits(page_lengths), 16)
+        writer.write(min(content_offsets), 32)
+        writer.write(delta_bits(content_offsets), 16)
+        writer.write(min(content_lengths), 32)
+        writer.write(delta_bits(content_lengths), 16)
+        writer.write(max_shared.bit_length(), 16)
+        writer.write(max_identifier.bit_length(), 16)
+        writer.write(0, 16)
+        writer.write(1, 16)
+        writer.write_all(deltas(num_of_objects), delta_bits(num_of_objects))
+        writer.write_all(deltas(page_lengths), delta_bits(page_lengths))
+        writer.write_all([len(identifiers) for identifiers in page_shared], max_shared.bit_length())
+        writer.write_all(
+            [identifier for identifiers in page_shared for identifier in identifiers],
+            max_identifier.bit_length(),
+        )
+        writer.align()
+        writer.write_all(deltas(content_offsets), delta_bits(content_offsets))
+        writer.write_all(deltas(content_lengths), delta_bits(content_lengths))
+        shared_table_offset = len(writer.buffer)
+        # shared object hint table, one object per group
+        group_lengths = [lengths[obj] for obj in [*first_page, *shared]]
+        writer.write(shared[0].obj_num if len(shared) > 0 else 0, 32)
+        writer.write(offsets[shared[0]] if len(shared) > 0 else 0, 32)
+        writer.write(len(first_page), 32)
+        writer.write(len(group_lengths), 32)
+        writer.write(0, 16)
+        writer.write(min(group_lengths), 32)
+        writer.write(delta_bits(group_lengths), 16)
+        writer.write_all(deltas(group_lengths), delta_bits(group_lengths))
+        writer.write_all([0] * len(group_lengths), 1)
+        return writer.buffer, shared_table_offset
+
+    def _linearization_dict(
+        self,
+        obj_num: int,
+        file_length: int,
+        hint_offset: int,
+        hint_length: int,
+        first_page_num: int,
+        end_of_first_page: int,
+        num_of_pages: int,
+        main_xref_entries_offset: int,
+    ) -> bytes:
+        return b"%d 0 obj\n<< /Linearized 1 /L %d /H [%d %d] /O %d /E %d /N %d /T %d" % (
+            obj_num,
+            file_length,
+            hint_offset,
+            hint_length,
+            first_page_num,
+            end_of_first_page,
+            num_of_pages,
+            main_xref_entries_offset,
+        )
+
+    def _first_trailer(
+        self,
+        size: int,
+        catalog_num: int,
+        document_id: bytes,
+        main_xref_offset: int,
+        length: None | int,
+    ) -> bytes:
+        # without a length the trailer is not padded, which gives the length to reserve
+        trailer = b"trailer\n<< /Size %d /Root %d 0 R /ID [%b] /Prev %d" % (
+            size,
+            catalog_num,
+            document_id,
+            main_xref_offset,
+        )
+        if length is None:
+            return trailer + b" >>\nstartxref\n0\n%%EOF\n"
+        return pad(trailer, length - len(b" >>\nstartxref\n0\n%%EOF\n")) + b" >>\nstartxref\n0\n%%EOF\n"
+
+    def _xref(self, first_obj_num: int, offsets: list[int]) -> bytes:
+        b = bytearray()
+        b.extend(b"xref\n%d %d\n" % (first_obj_num, len(offsets)))
+        for index, offset in enumerate(offsets):
+            if first_obj_num + index == 0:
+                b.extend(b"0000000000 65535 f \n")
+            else:
+                b.extend(b"%010d 00000 n \n" % offset)
+        return bytes(b)
+
+
+def segments_length(segments: list[bytes | bytearray | memoryview]) -> int:
+    return sum(len(segment) for segment in segments)
+
+
+def pad(value: bytes, length: int) -> bytes:
+    if len(value) > length:
+        raise ValueError(f"Value of {len(value)} bytes does not fit in the reserved {length} bytes.")
+    return value + b" " * (length - len(value))
+
+
+def deltas(values: list[int]) -> list[int]:
+    least = min(values)
+    return [value - least for value in values]
+
+
+def delta_bits(values: list[int]) -> int:
+    return (max(values) - min(values)).bit_length()
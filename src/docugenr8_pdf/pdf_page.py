@@ -1,6 +1,13 @@
-import zlib
+from __future__ import annotations
+
+from collections.abc import Iterable
+from collections.abc import Iterator
+from functools import lru_cache
+from math import cos
+from math import radians
+from math import sin
+from math import tan
 
-from docugenr8_shared.colors import MaterialColors
 from docugenr8_shared.dto import DtoArc
 from docugenr8_shared.dto import DtoBezier
 from docugenr8_shared.dto import DtoCurve
@@ -15,31 +22,175 @@ from docugenr8_shared.dto import DtoTextBox
 
 from .core import Collector
 from .core import PdfObj
+from .pdf_cache import CompressedStreamCache
 from .pdf_content import PdfContent
 from .pdf_font import PdfFont
+from .pdf_image import PdfImage
+from .pdf_standard_font import PdfStandardFont
+from .pdf_text_columns import PdfTextColumns
+
+
+DEBUG_LAYER = "DebugLayer"
+IDENTITY_MATRIX = (1, 0, 0, 1, 0, 0)
+PATH_CACHE_SIZE = 1024
+
+
+def multiply_matrices(
+    first: tuple[float, ...],
+    second: tuple[float, ...],
+) -> tuple[float, float, float, float, float, float]:
+    # product of two [a b c d e f] matrices, first applied first
+    a1, b1, c1, d1, e1, f1 = first
+    a2, b2, c2, d2, e2, f2 = second
+    return (
+        a1 * a2 + b1 * c2,
+        a1 * b2 + b1 * d2,
+        c1 * a2 + d1 * c2,
+        c1 * b2 + d1 * d2,
+        e1 * a2 + f1 * c2 + e2,
+        e1 * b2 + f1 * d2 + f2,
+    )
+
+
+def around_origin(
+    linear: tuple[float, float, float, float],
+    x_origin: float,
+    y_origin: float,
+) -> tuple[float, float, float, float, float, float]:
+    # translate to origin, apply linear part and translate back
+    a, b, c, d = linear
+    return (a, b, c, d, x_origin - x_origin * a - y_origin * c, y_origin - x_origin * b - y_origin * d)
+
+
+def calc_trim(width: float, height: float, rounded_corner: float) -> float:
+    if width < height:
+        trim = (width * (rounded_corner / 100)) / 2
+    else:
+        trim = (height * (rounded_corner / 100)) / 2
+    return trim
+
+
+# shape paths are encoded relative to the bottom-left corner of the shape,
+# so shapes of the same size share the bytes and are placed with a cm
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def rounded_rectangle_path(
+    width: float,
+    height: float,
+    top_left: float,
+    top_right: float,
+    bottom_right: float,
+    bottom_left: float,
+) -> bytes:
+    trim_top_left = calc_trim(width, height, top_left)
+    trim_top_right = calc_trim(width, height, top_right)
+    trim_bottom_right = calc_trim(width, height, bottom_right)
+    trim_bottom_left = calc_trim(width, height, bottom_left)
+    path = PdfContent()
+    path.add_path_start_point(trim_top_left, height)
+    path.add_path_move_point(width - trim_top_right, height)
+    if top_right != 0:
+        path.add_arc(width - trim_top_right, height, width, height - trim_top_right)
+    path.add_path_move_point(width, trim_bottom_right)
+    if bottom_right != 0:
+        path.add_arc(width, trim_bottom_right, width - trim_bottom_right, 0)
+    path.add_path_move_point(trim_bottom_left, 0)
+    if bottom_left != 0:
+        path.add_arc(trim_bottom_left, 0, 0, trim_bottom_left)
+    path.add_path_move_point(0, height - trim_top_left)
+    if top_left != 0:
+        path.add_arc(0, height - trim_top_left, trim_top_left, height)
+    path.add_path_close_line()
+    return bytes(path.stream)
+
+
+@lru_cache(maxsize=PATH_CACHE_SIZE)
+def ellipse_path(width: float, height: float) -> bytes:
+    path = PdfContent()
+    path.add_path_start_point(0, height / 2)
+    path.add_arc(0, height / 2, width / 2, height)
+    path.add_arc(width / 2, height, width, height / 2)
+    path.add_arc(width, height / 2, width / 2, 0)
+    path.add_arc(width / 2, 0, 0, height / 2)
+    path.add_path_close_line()
+    return bytes(path.stream)
 
 
 class PdfPage:
-    def __init__(self, page_width: float, page_height: float) -> None:
+    def __init__(self, page_width: float, page_height: float, spill_threshold: None | int = None) -> None:
         self.page_obj: None | PdfObj = None
         self._pagefont_num: int = 1
         self._fontname_to_pagefontname: dict[str, str] = {}
-        self._pagefontname_fontresource: dict[str, PdfFont] = {}
+        self._pagefontname_fontresource: dict[str, PdfFont | PdfStandardFont] = {}
         self._page_width: float = page_width
         self._page_height: float = page_height
-        self._page_content = PdfContent()
+        self._page_content = PdfContent(spill_threshold)
         self.resources_obj: None | PdfObj = None
         self.contents_obj: None | PdfObj = None
+        # length of the content stream it was compressed from and the result
+        self.compressed_stream: None | tuple[int, bytes] = None
+        self.has_debug_layer = False
+        self.debug_layer_obj: None | PdfObj = None
+        self._images: dict[str, PdfImage] = {}
+        # contents drawn on the page directly instead of through the dto,
+        # kept for the document digest
+        self.direct_contents: list[tuple[str | float, ...]] = []
+        # image XObjects by image digest, shared by all pages of a document
+        self.image_objs: dict[str, PdfObj] = {}
 
-    def get_pagefontname(self, font_name: str, pdf_fonts: dict[str, PdfFont]):
+    def get_pagefontname(self, font_name: str, pdf_fonts: dict[str, PdfFont | PdfStandardFont]):
         if font_name in self._fontname_to_pagefontname:
             return self._fontname_to_pagefontname[font_name]
+        # names sharing one font also share its page font name
+        for pagefontname, font in self._pagefontname_fontresource.items():
+            if font is pdf_fonts[font_name]:
+                self._fontname_to_pagefontname[font_name] = pagefontname
+                return pagefontname
         pagefontname = f"F{self._pagefont_num}"
         self._fontname_to_pagefontname[font_name] = pagefontname
         self._pagefontname_fontresource[pagefontname] = pdf_fonts[font_name]
         self._pagefont_num += 1
         return pagefontname
 
+    def use_page_fonts(self, page: PdfPage, pdf_fonts: dict[str, PdfFont | PdfStandardFont]) -> None:
+        # continues the font naming of a page generated with other fonts
+        self.use_fonts(
+            {page_font_name: pdf_fonts[font_name] for page_font_name, font_name in page.page_font_names().items()}
+        )
+
+    def use_fonts(self, page_fonts: dict[str, PdfFont | PdfStandardFont]) -> None:
+        self._pagefont_num = len(page_fonts) + 1
+        self._fontname_to_pagefontname = {font.name: page_font_name for page_font_name, font in page_fonts.items()}
+        self._pagefontname_fontresource = dict(page_fonts)
+
+    def add_image(self, image: PdfImage, x: float, y: float, width: float, height: float) -> None:
+        # x and y are the top left corner, like for other contents
+        image_name = next(
+            (name for name, page_image in self._images.items() if page_image.digest == image.digest),
+            f"Im{len(self._images) + 1}",
+        )
+        self._images[image_name] = image
+        self.direct_contents.append(("image", image.digest, x, y, width, height))
+        self._page_content.add_savestate()
+        self._page_content.add_transform((width, 0, 0, height, x, self.calc_y(y, height)))
+        self._page_content.add_xobject(image_name)
+        self._page_content.add_restore_state()
+
+    def page_images(self) -> list[PdfImage]:
+        return list(self._images.values())
+
+    def page_fonts(self) -> list[PdfFont | PdfStandardFont]:
+        return list(self._pagefontname_fontresource.values())
+
+    def page_size(self) -> tuple[float, float]:
+        return (self._page_width, self._page_height)
+
+    def page_font_names(self) -> dict[str, str]:
+        return {page_font_name: font.name for page_font_name, font in self._pagefontname_fontresource.items()}
+
+    def add_compiled_contents(self, contents: bytes) -> None:
+        self._page_content.stream.extend(contents)
+        self._page_content.spill_if_needed()
+
     def calc_y(self, y: float, height: float | None = None):
         """Change y coordinate from top-to-bottom to bottom-to-top
         and moves content origin to bottom-left.
@@ -49,21 +200,42 @@ class PdfPage:
         return self._page_height - y - height
 
     def calc_trim(self, width: float, height: float, rounded_corner: float) -> float:
-        if width < height:
-            trim = (width * (rounded_corner / 100)) / 2
-        else:
-            trim = (height * (rounded_corner / 100)) / 2
-        return trim
+        return calc_trim(width, height, rounded_corner)
+
+    def add_transformations(self, transformations: list[DtoRotation | DtoSkew]) -> None:
+        # the whole list is composed into a single matrix, applied
+        # in the same order as consecutive cm operators would be
+        matrix: tuple[float, ...] = IDENTITY_MATRIX
+        for transformation in transformations:
+            if isinstance(transformation, DtoRotation):
+                cos_r = cos(radians(transformation.degrees))
+                sin_r = sin(radians(transformation.degrees))
+                linear = (cos_r, sin_r, -sin_r, cos_r)
+            elif isinstance(transformation, DtoSkew):
+                linear = (
+                    1,
+                    tan(radians(transformation.vertical_degrees)),
+                    tan(radians(transformation.horizontal_degrees)),
+                    1,
+                )
+            else:
+                raise TypeError("The transformation is not a valid object.")
+            matrix = multiply_matrices(
+                around_origin(linear, transformation.x_origin, self.calc_y(transformation.y_origin)),
+                matrix,
+            )
+        if matrix != IDENTITY_MATRIX:
+            self._page_content.add_transform(tuple(round(value, 6) for value in matrix))
 
     def generate_pdf_obj(self, collector: Collector):
-        self.page_obj = collector.new_obj()
+        self.page_obj = collector.new_obj("/Page")
         self.resources_obj = collector.new_obj()
         self.contents_obj = collector.new_obj()
 
     def add_dto_page_contents(
         self,
         contents: list[object],
-        pdf_fonts: dict[str, PdfFont],
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
         debug: bool,
     ) -> None:
         for content in contents:
@@ -82,8 +254,15 @@ class PdfPage:
                     self.generate_ellipse(content)
                 case _:
                     raise ValueError("Type not defined in pdf module.")
+            self._page_content.spill_if_needed()
 
     def draw_text_area(self, dto_text_area: DtoTextArea) -> None:
+        from docugenr8_shared.colors import MaterialColors
+
+        # debug geometry goes to an optional content group, so it can be
+        # hidden in the viewer instead of rendering the document twice
+        self.has_debug_layer = True
+        self._page_content.add_optional_content_begin(DEBUG_LAYER)
         self._page_content.add_rectangle(
             x=dto_text_area.x,
             y=self.calc_y(dto_text_area.y, dto_text_area.height),
@@ -130,55 +309,116 @@ class PdfPage:
                     #         fill_color=MaterialColors.Purple100,
                     #         line_color=MaterialColors.Purple600,
                     #         )
+        self._page_content.add_optional_content_end()
 
     def check_and_update_text_state(
         self,
-        current_state: tuple[float, tuple[float, float, float], str] | tuple[None, None, None],
-        fragment: DtoFragment,
-        pdf_fonts: dict[str, PdfFont],
-    ) -> tuple[float, tuple[float, float, float], str]:
-        new_state = (
-            fragment.font_size,
-            fragment.font_color,
-            fragment.font_name,
-        )
+        current_state: tuple[float, tuple[int, int, int], str] | tuple[None, None, None],
+        new_state: tuple[float, tuple[int, int, int], str],
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
+    ) -> tuple[float, tuple[int, int, int], str]:
         if (
             current_state[0] is None or current_state[1] is None or current_state[2] is None
         ) or new_state != current_state:
-            page_font_name = self.get_pagefontname(fragment.font_name, pdf_fonts)
-            self._page_content.add_page_font_with_size(page_font_name, fragment.font_size)
-            self._page_content.add_fill_color(fragment.font_color)
+            font_size, font_color, font_name = new_state
+            page_font_name = self.get_pagefontname(font_name, pdf_fonts)
+            self._page_content.add_text_font(page_font_name, font_size)
+            self._page_content.add_fill_color(font_color)
             return new_state
         return current_state
 
-    def draw_text_fragment(self, fragment: DtoFragment, pdf_font: PdfFont) -> None:
+    def get_fragment_cids(self, fragment: DtoFragment, pdf_font: PdfFont | PdfStandardFont) -> bytearray:
         cid_in_bytes = bytearray()
         for char in fragment.chars:
             cid = pdf_font.get_cid_in_bytes(char)
             if cid is not None:
                 cid_in_bytes.extend(cid)
-        if len(cid_in_bytes) > 0:
-            self._page_content.add_text(fragment.x, self.calc_y(fragment.baseline), cid_in_bytes)
+        return cid_in_bytes
 
     def generate_text_area(
         self,
         dto_text_area: DtoTextArea,
-        pdf_fonts: dict[str, PdfFont],
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
         debug: bool,
     ) -> None:
         self._page_content.add_savestate()
         if debug:
             self.draw_text_area(dto_text_area)
-        current_state = (None, None, None)
-        for fragment in dto_text_area.fragments:
-            current_state = self.check_and_update_text_state(current_state, fragment, pdf_fonts)
-            self.draw_text_fragment(fragment, pdf_fonts[fragment.font_name])
+        self.add_text_fragments(self._dto_text_fragments(dto_text_area.fragments, pdf_fonts), pdf_fonts)
         self._page_content.add_restore_state()
 
+    def add_text_columns(
+        self,
+        text_columns: PdfTextColumns,
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
+    ) -> None:
+        # same operators as a text area with the same fragments
+        self.direct_contents.append(("text_columns", text_columns.content_digest()))
+        self._page_content.add_savestate()
+        self._page_content.add_text_object(
+            text_columns.text_object(
+                pdf_fonts,
+                self._page_height,
+                lambda font_name: self.get_pagefontname(font_name, pdf_fonts),
+            )
+        )
+        self._page_content.add_restore_state()
+
+    def _dto_text_fragments(
+        self,
+        fragments: list[DtoFragment],
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
+    ) -> Iterator[tuple[float, float, float, tuple[int, int, int], str, bytes | bytearray, int]]:
+        for fragment in fragments:
+            pdf_font = pdf_fonts[fragment.font_name]
+            cid_in_bytes = self.get_fragment_cids(fragment, pdf_font)
+            yield (
+                fragment.x,
+                fragment.baseline,
+                fragment.font_size,
+                fragment.font_color,
+                fragment.font_name,
+                cid_in_bytes,
+                pdf_font.get_cids_width(cid_in_bytes),
+            )
+
+    def add_text_fragments(
+        self,
+        fragments: Iterable[tuple[float, float, float, tuple[int, int, int], str, bytes | bytearray, int]],
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
+    ) -> None:
+        # fragments are x, baseline, font size, font color, font name,
+        # cids and the width of the cids in font units
+        self._page_content.add_text_begin()
+        current_state: tuple[float, tuple[int, int, int], str] | tuple[None, None, None] = (None, None, None)
+        # fragments sharing baseline and text state are merged into one TJ
+        text_run: list[tuple[float, bytes | bytearray]] = []
+        line_start = (0.0, 0.0)
+        run_end = (0.0, 0.0)
+        for x, baseline, font_size, font_color, font_name, cid_in_bytes, cids_width in fragments:
+            if len(cid_in_bytes) == 0:
+                continue
+            y = self.calc_y(baseline)
+            new_state = (font_size, font_color, font_name)
+            if len(text_run) > 0 and (new_state != current_state or y != run_end[1] or font_size == 0):
+                self._page_content.add_text_run(text_run)
+                text_run = []
+            current_state = self.check_and_update_text_state(current_state, new_state, pdf_fonts)
+            if len(text_run) == 0:
+                self._page_content.add_text_position(round(x - line_start[0], 6), round(y - line_start[1], 6))
+                line_start = (x, y)
+                text_run.append((0, cid_in_bytes))
+            else:
+                text_run.append((round((run_end[0] - x) * 1000 / font_size, 3), cid_in_bytes))
+            run_end = (x + cids_width * font_size / 1000, y)
+        if len(text_run) > 0:
+            self._page_content.add_text_run(text_run)
+        self._page_content.add_text_end()
+
     def generate_text_box(
         self,
         dto_textbox: DtoTextBox,
-        pdf_fonts: dict[str, PdfFont],
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
         debug: bool,
     ) -> None:
         self._page_content.add_rectangle(
@@ -196,20 +436,7 @@ class PdfPage:
 
     def generate_curve(self, dto_curve: DtoCurve) -> None:
         self._page_content.add_savestate()
-        for transformation in dto_curve.transformations:
-            if isinstance(transformation, DtoRotation):
-                self._page_content.add_rotate(
-                    transformation.x_origin, self.calc_y(transformation.y_origin), transformation.degrees
-                )
-            elif isinstance(transformation, DtoSkew):
-                self._page_content.add_skew(
-                    transformation.x_origin,
-                    self.calc_y(transformation.y_origin),
-                    transformation.vertical_degrees,
-                    transformation.horizontal_degrees,
-                )
-            else:
-                raise TypeError("The transformation is not a valid object.")
+        self.add_transformations(dto_curve.transformations)
         if dto_curve.fill_color is not None:
             self._page_content.add_fill_color(dto_curve.fill_color)
         if dto_curve.line_color is not None:
@@ -239,20 +466,7 @@ class PdfPage:
 
     def generate_rectangle(self, dto_rectangle: DtoRectangle):
         self._page_content.add_savestate()
-        for transformation in dto_rectangle.transformations:
-            if isinstance(transformation, DtoRotation):
-                self._page_content.add_rotate(
-                    transformation.x_origin, self.calc_y(transformation.y_origin), transformation.degrees
-                )
-            elif isinstance(transformation, DtoSkew):
-                self._page_content.add_skew(
-                    transformation.x_origin,
-                    self.calc_y(transformation.y_origin),
-                    transformation.vertical_degrees,
-                    transformation.horizontal_degrees,
-                )
-            else:
-                raise TypeError("The transformation is not a valid object.")
+        self.add_transformations(dto_rectangle.transformations)
 
         if dto_rectangle.fill_color is not None:
             self._page_content.add_fill_color(dto_rectangle.fill_color)
@@ -273,65 +487,20 @@ class PdfPage:
                 dto_rectangle.height,
             )
         else:
-            x = dto_rectangle.x
-            y = dto_rectangle.y
-            width = dto_rectangle.width
-            height = dto_rectangle.height
-            # first point
-            self._page_content.add_path_start_point(
-                x + self.calc_trim(width, height, dto_rectangle.rounded_corner_top_left), self.calc_y(y)
-            )
-            # second point
-            self._page_content.add_path_move_point(
-                x + width - self.calc_trim(width, height, dto_rectangle.rounded_corner_top_right), self.calc_y(y)
-            )
-            # third point
-            if dto_rectangle.rounded_corner_top_right != 0:
-                self._page_content.add_arc(
-                    x + width - self.calc_trim(width, height, dto_rectangle.rounded_corner_top_right),
-                    self.calc_y(y),
-                    x + width,
-                    self.calc_y(y + self.calc_trim(width, height, dto_rectangle.rounded_corner_top_right)),
-                )
-            # fourth point
-            self._page_content.add_path_move_point(
-                x + width,
-                self.calc_y(y + height - self.calc_trim(width, height, dto_rectangle.rounded_corner_bottom_right)),
-            )
-            # fifth point
-            if dto_rectangle.rounded_corner_bottom_right != 0:
-                self._page_content.add_arc(
-                    x + width,
-                    self.calc_y(y + height - self.calc_trim(width, height, dto_rectangle.rounded_corner_bottom_right)),
-                    x + width - self.calc_trim(width, height, dto_rectangle.rounded_corner_bottom_right),
-                    self.calc_y(y + height),
-                )
-            # sixth point
-            self._page_content.add_path_move_point(
-                x + self.calc_trim(width, height, dto_rectangle.rounded_corner_bottom_left), self.calc_y(y + height)
+            self._page_content.add_translate(
+                dto_rectangle.x,
+                self.calc_y(dto_rectangle.y, dto_rectangle.height),
             )
-            # seventh point
-            if dto_rectangle.rounded_corner_bottom_left != 0:
-                self._page_content.add_arc(
-                    x + self.calc_trim(width, height, dto_rectangle.rounded_corner_bottom_left),
-                    self.calc_y(y + height),
-                    x,
-                    self.calc_y(y + height - self.calc_trim(width, height, dto_rectangle.rounded_corner_bottom_left)),
+            self._page_content.add_path(
+                rounded_rectangle_path(
+                    dto_rectangle.width,
+                    dto_rectangle.height,
+                    dto_rectangle.rounded_corner_top_left,
+                    dto_rectangle.rounded_corner_top_right,
+                    dto_rectangle.rounded_corner_bottom_right,
+                    dto_rectangle.rounded_corner_bottom_left,
                 )
-            # eigth point
-            self._page_content.add_path_move_point(
-                x, self.calc_y(y + self.calc_trim(width, height, dto_rectangle.rounded_corner_top_left))
             )
-            # ninth point
-            if dto_rectangle.rounded_corner_top_left != 0:
-                self._page_content.add_arc(
-                    x,
-                    self.calc_y(y + self.calc_trim(width, height, dto_rectangle.rounded_corner_top_left)),
-                    x + self.calc_trim(width, height, dto_rectangle.rounded_corner_top_left),
-                    self.calc_y(y),
-                )
-            # close line
-            self._page_content.add_path_close_line()
         if dto_rectangle.fill_color is not None and dto_rectangle.line_color is not None:
             self._page_content.add_path_both_stroke_and_fill()
         if dto_rectangle.fill_color is not None and dto_rectangle.line_color is None:
@@ -344,20 +513,7 @@ class PdfPage:
         if dto_arc.line_color is None:
             return
         self._page_content.add_savestate()
-        for transformation in dto_arc.transformations:
-            if isinstance(transformation, DtoRotation):
-                self._page_content.add_rotate(
-                    transformation.x_origin, self.calc_y(transformation.y_origin), transformation.degrees
-                )
-            elif isinstance(transformation, DtoSkew):
-                self._page_content.add_skew(
-                    transformation.x_origin,
-                    self.calc_y(transformation.y_origin),
-                    transformation.vertical_degrees,
-                    transformation.horizontal_degrees,
-                )
-            else:
-                raise TypeError("The transformation is not a valid object.")
+        self.add_transformations(dto_arc.transformations)
 
         self._page_content.add_line_color(dto_arc.line_color)
         self._page_content.add_line_width(dto_arc.line_width)
@@ -369,20 +525,7 @@ class PdfPage:
 
     def generate_ellipse(self, dto_ellipse: DtoEllipse) -> None:
         self._page_content.add_savestate()
-        for transformation in dto_ellipse.transformations:
-            if isinstance(transformation, DtoRotation):
-                self._page_content.add_rotate(
-                    transformation.x_origin, self.calc_y(transformation.y_origin), transformation.degrees
-                )
-            elif isinstance(transformation, DtoSkew):
-                self._page_content.add_skew(
-                    transformation.x_origin,
-                    self.calc_y(transformation.y_origin),
-                    transformation.vertical_degrees,
-                    transformation.horizontal_degrees,
-                )
-            else:
-                raise TypeError("The transformation is not a valid object.")
+        self.add_transformations(dto_ellipse.transformations)
 
         has_fill = False
         has_stroke = False
@@ -404,23 +547,34 @@ class PdfPage:
             self._page_content.add_line_width(dto_ellipse.line_width)
             self._page_content.add_line_pattern(dto_ellipse.line_pattern)
 
-        x = dto_ellipse.x
-        y = dto_ellipse.y
-        width = dto_ellipse.width
-        height = dto_ellipse.height
-        self._page_content.add_path_start_point(x, self.calc_y(y + height / 2))
-        self._page_content.add_arc(x, self.calc_y(y + height / 2), (x + width / 2), self.calc_y(y))
-        self._page_content.add_arc((x + width / 2), self.calc_y(y), (x + width), self.calc_y(y + height / 2))
-        self._page_content.add_arc((x + width), self.calc_y(y + height / 2), (x + width / 2), self.calc_y(y + height))
-        self._page_content.add_arc((x + width / 2), self.calc_y(y + height), x, self.calc_y(y + height / 2))
-        self._page_content.add_path_close_line()
+        self._page_content.add_translate(dto_ellipse.x, self.calc_y(dto_ellipse.y, dto_ellipse.height))
+        self._page_content.add_path(ellipse_path(dto_ellipse.width, dto_ellipse.height))
 
         self._page_content.add_fill_and_shape(has_fill, has_stroke)
         self._page_content.add_restore_state()
 
+    def contents_length(self) -> int:
+        return self._page_content.length()
+
+    def contents_bytes(self) -> bytes:
+        return self._page_content.getvalue()
+
+    def close(self) -> None:
+        # removes the contents and their temporary file, if they were spilled
+        self._page_content.close()
+        self.compressed_stream = None
+
+    def compress_stream(self, compressed_stream_cache: None | CompressedStreamCache = None) -> bytes:
+        # reused until more contents are added to the page
+        stream_length = self._page_content.length()
+        if self.compressed_stream is None or self.compressed_stream[0] != stream_length:
+            self.compressed_stream = (stream_length, self._page_content.compress(compressed_stream_cache))
+        return self.compressed_stream[1]
+
     def build(
         self,
         should_compress: bool,
+        compressed_stream_cache: None | CompressedStreamCache = None,
     ):
         if self.page_obj is None:
             raise ValueError("Page object not initialized.")
@@ -431,15 +585,26 @@ class PdfPage:
         self.page_obj.set_attribute_value("/MediaBox", f"[0 0 {self._page_width} {self._page_height}]")
         self.page_obj.set_attribute_value("/Resources", self.resources_obj)
         self.resources_obj.set_attribute_value("/ProcSet", "[/PDF /Text /ImageB /ImageC /ImageI]")
-        self.resources_obj.set_attribute_value("/XObject", "<<\t>>")
+        if len(self._images) > 0:
+            self.resources_obj.set_attribute_value(
+                "/XObject",
+                {f"/{name}": self.image_objs[image.digest] for name, image in self._images.items()},
+            )
+        else:
+            self.resources_obj.set_attribute_value("/XObject", "<<\t>>")
         self.page_obj.add_attribute_value("/Contents", self.contents_obj)
         if should_compress:
-            self.contents_obj.extend_stream(zlib.compress(self._page_content.stream))
+            self.contents_obj.extend_stream(self.compress_stream(compressed_stream_cache))
             self.contents_obj.set_attribute_value("/Filter", "/FlateDecode")
         else:
-            self.contents_obj.extend_stream(self._page_content.stream)
+            for segment in self._page_content.segments():
+                self.contents_obj.extend_stream(segment)
         fonts_dict = {}
         for page_fontname, font in self._pagefontname_fontresource.items():
             page_fontname_formatted = f"/{page_fontname}"
             fonts_dict[page_fontname_formatted] = font.obj_num
         self.resources_obj.set_attribute_value("/Font", fonts_dict)
+        if self.has_debug_layer:
+            if self.debug_layer_obj is None:
+                raise ValueError("Debug layer object not initialized.")
+            self.resources_obj.set_attribute_value("/Properties", {f"/{DEBUG_LAYER}": self.debug_layer_obj})
@@ -1,5 +1,35 @@
+from .pdf_cache import CompressedStreamCache
+from .pdf_cache import FontCache
+from .pdf_cache import RenderCache
+
+
 class PDFSettings:
     def __init__(self) -> None:
         self.compression: bool = False
         self.decimal_precision: int = 2
         self.debug: bool = False
+        # debug layer is hidden when the document is opened unless set
+        self.debug_layer_visible: bool = False
+        # dto font names drawn with a standard 14 font instead of embedding,
+        # e.g. {"Body": "Helvetica"}
+        self.standard_fonts: dict[str, str] = {}
+        # "fidelity" embeds fonts with hinting, "minimal" strips hinting,
+        # kerning and names for smaller files
+        self.font_embedding_profile: str = "fidelity"
+        # page contents beyond this many bytes are moved to a temporary file
+        # and memory-mapped when written, None keeps them in memory
+        self.content_spill_threshold: None | int = None
+        # maximum number of kids of a node in the page tree
+        self.page_tree_fan_out: int = 64
+        # parsed fonts shared by documents, which use forks of them
+        self.font_cache: None | FontCache = None
+        # fonts are subsetted on a background thread pool when greater than 0
+        self.font_workers: int = 0
+        # first page and its resources are written first (Fast Web View)
+        self.linearize: bool = False
+        # /ID is derived from the document digest instead of the current time
+        self.deterministic: bool = False
+        # compressed page contents and font streams shared by documents
+        self.compressed_stream_cache: None | CompressedStreamCache = None
+        # used only in deterministic mode
+        self.render_cache: None | RenderCache = None
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .pdf import Pdf
+from .pdf import create_font
+from .pdf import create_fonts
+from .pdf import unique_fonts
+from .pdf_font import PdfFont
+from .pdf_page import PdfPage
+from .pdf_settings import PDFSettings
+from .pdf_standard_font import PdfStandardFont
+
+
+if TYPE_CHECKING:
+    from docugenr8_shared.dto import Dto
+    from docugenr8_shared.dto import DtoFont
+
+
+class PdfShard:
+    """Pages of a document rendered apart from the rest of the document.
+
+    Holds only bytes, numbers and strings, so shards can be pickled and
+    rendered in other processes or on other machines.
+    """
+
+    def __init__(self) -> None:
+        # width, height, contents, compressed contents, page font name
+        # to dto font name and whether the page has a debug layer
+        self.pages: list[tuple[float, float, bytes, None | bytes, dict[str, str], bool]] = []
+        # code points of the glyphs of every font used by the pages
+        self.font_code_points: dict[str, tuple[int, ...]] = {}
+
+
+def render_shard(
+    dto: Dto,
+    first_page: int,
+    last_page: int,
+    settings: None | PDFSettings = None,
+) -> PdfShard:
+    """Renders pages from first_page up to, but not including, last_page."""
+    if settings is None:
+        settings = PDFSettings()
+    fonts = create_fonts(dto.fonts, settings.standard_fonts, settings.font_cache)
+    for font in unique_fonts(fonts):
+        if isinstance(font, PdfFont):
+            # all shards encode text with the same cids, the glyph ids
+            font.use_identity_cids()
+    shard = PdfShard()
+    for dto_page in dto.pages[first_page:last_page]:
+        pdf_page = PdfPage(dto_page.width, dto_page.height)
+        pdf_page.add_dto_page_contents(dto_page.contents, fonts, settings.debug)
+        # pages are compressed here, so merging does not compress them again
+        compressed_contents = None
+        if settings.compression:
+            compressed_contents = pdf_page.compress_stream(settings.compressed_stream_cache)
+        page_font_names = pdf_page.page_font_names()
+        shard.pages.append(
+            (
+                *pdf_page.page_size(),
+                pdf_page.contents_bytes(),
+                compressed_contents,
+                page_font_names,
+                pdf_page.has_debug_layer,
+            )
+        )
+        for font_name in page_font_names.values():
+            shard.font_code_points[font_name] = ()
+        pdf_page.close()
+    for font_name in shard.font_code_points:
+        font = fonts[font_name]
+        if isinstance(font, PdfFont):
+            shard.font_code_points[font_name] = font.used_code_points()
+    for font in unique_fonts(fonts):
+        font.close()
+    return shard
+
+
+def merge_shards(
+    dto_fonts: list[DtoFont],
+    shards: list[PdfShard],
+    settings: None | PDFSettings = None,
+) -> Pdf:
+    """Creates one document from shards given in page order.
+
+    Shards encode text with the glyph ids of the fonts as cids, so their
+    contents are used as they are. Each font is parsed and subsetted once
+    with the glyphs of all shards and added as one font dictionary.
+    """
+    pdf = Pdf(settings=settings)
+    fonts: dict[str, PdfFont | PdfStandardFont] = {}
+    for dto_font in dto_fonts:
+        if not any(dto_font.name in shard.font_code_points for shard in shards):
+            continue
+        font = create_font(dto_font, pdf.settings.standard_fonts)
+        if isinstance(font, PdfFont):
+            font.use_identity_cids()
+            for shard in shards:
+                font.add_code_points(shard.font_code_points.get(dto_font.name, ()))
+        pdf.add_font(dto_font.name, font)
+        fonts[dto_font.name] = font
+    for shard in shards:
+        for (
+            page_width,
+            page_height,
+            contents,
+            compressed_contents,
+            page_font_names,
+            has_debug_layer,
+        ) in shard.pages:
+            pdf.add_to_digest((page_width, page_height, contents, page_font_names))
+            pdf_page = PdfPage(page_width, page_height)
+            pdf_page.use_fonts(
+                {page_font_name: fonts[font_name] for page_font_name, font_name in page_font_names.items()}
+            )
+            pdf_page.add_compiled_contents(contents)
+            if compressed_contents is not None:
+                pdf_page.compressed_stream = (len(contents), compressed_contents)
+            pdf_page.has_debug_layer = has_debug_layer
+            pdf.pages.append(pdf_page)
+    return pdf
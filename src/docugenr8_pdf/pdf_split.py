@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+from .pdf import Pdf
+from .pdf import create_fonts
+from .pdf import unique_fonts
+from .pdf_font import PdfFont
+from .pdf_settings import PDFSettings
+from .pdf_standard_font import PdfStandardFont
+
+
+if TYPE_CHECKING:
+    from docugenr8_shared.dto import Dto
+
+
+def split_output(
+    dto: Dto,
+    page_ranges: list[tuple[int, int]],
+    settings: None | PDFSettings = None,
+    workers: int = 0,
+) -> Iterator[Pdf]:
+    """Renders an independent document for every range of pages.
+
+    Ranges go from the first page up to, but not including, the last page.
+    Fonts are parsed once and forked for every document, so each document
+    embeds only the glyphs used on its own pages. Documents are yielded in
+    the order of the ranges with their output kept, so writing them does
+    not render them again, and each one can be written and closed before
+    the next is taken. When workers is greater than 0, documents are
+    rendered on a thread pool, at most workers of them ahead of the one
+    yielded.
+    """
+    if settings is None:
+        settings = PDFSettings()
+    for first_page, last_page in page_ranges:
+        if not 0 <= first_page < last_page <= len(dto.pages):
+            raise ValueError(f"Page range {first_page}-{last_page} is not valid.")
+    # forks share the parsed fonts, so these are not closed here
+    fonts = create_fonts(dto.fonts, settings.standard_fonts, settings.font_cache)
+    return render_page_ranges(dto, fonts, page_ranges, settings, workers)
+
+
+def render_page_ranges(
+    dto: Dto,
+    fonts: dict[str, PdfFont | PdfStandardFont],
+    page_ranges: list[tuple[int, int]],
+    settings: PDFSettings,
+    workers: int,
+) -> Iterator[Pdf]:
+    if workers == 0:
+        for first_page, last_page in page_ranges:
+            yield render_page_range(dto, fonts, first_page, last_page, settings)
+        return
+    from concurrent.futures import Future
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        jobs: deque[Future[Pdf]] = deque()
+        for first_page, last_page in page_ranges:
+            jobs.append(executor.submit(render_page_range, dto, fonts, first_page, last_page, settings))
+            # documents not yet taken are the only ones kept in memory
+            if len(jobs) > workers:
+                yield jobs.popleft().result()
+        while len(jobs) > 0:
+            yield jobs.popleft().result()
+
+
+def render_page_range(
+    dto: Dto,
+    fonts: dict[str, PdfFont | PdfStandardFont],
+    first_page: int,
+    last_page: int,
+    settings: PDFSettings,
+) -> Pdf:
+    pdf = Pdf(settings=settings)
+    forks = {id(font): font.fork() for font in unique_fonts(fonts)}
+    for font_name, font in fonts.items():
+        pdf.add_font(font_name, forks[id(font)])
+    pdf.add_dto_pages(dto.pages[first_page:last_page])
+    pdf.output_to_segments()
+    return pdf
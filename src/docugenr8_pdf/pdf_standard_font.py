@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from .core import Collector
+from .core import PdfObj
+from .pdf_cache import CompressedStreamCache
+from .pdf_standard_font_widths import FIRST_CHAR
+from .pdf_standard_font_widths import STANDARD_FONT_WIDTHS
+
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+CARRIAGE_RETURN = 13
+TAB = 9
+NEW_LINE = 10
+BACKSLASH = 92
+# characters outside of WinAnsiEncoding are shown as a question mark
+REPLACEMENT_CODE = 63
+ESCAPED_CODES = {40, 41, 92}  # (, ) and \
+# skipped by get_cid_in_bytes, so they take no space
+ZERO_WIDTH_CHARS = str.maketrans("", "", "\r\t\n")
+
+
+class PdfStandardFont:
+    """Standard 14 font referenced by name, without an embedded font program.
+
+    Text is encoded in WinAnsiEncoding and measured with the AFM widths of
+    the font, so the font file is never read.
+    """
+
+    def __init__(self, font_name: str, base_font: str) -> None:
+        if base_font not in STANDARD_FONT_WIDTHS:
+            raise ValueError(f"Font {base_font} is not one of the standard Latin fonts.")
+        self.name = font_name
+        self.base_font = base_font
+        self.widths = (0,) * FIRST_CHAR + STANDARD_FONT_WIDTHS[base_font]
+        self._char_to_code: dict[str, bytes] = {}
+        self.obj_num: None | PdfObj = None
+
+    def get_cid_in_bytes(self, input_string: str) -> bytes | None:
+        b = bytearray()
+        for char in input_string:
+            if char not in self._char_to_code:
+                if ord(char) in {CARRIAGE_RETURN, TAB, NEW_LINE}:
+                    return None
+                try:
+                    code = char.encode("cp1252")[0]
+                except UnicodeEncodeError:
+                    code = REPLACEMENT_CODE
+                if code < FIRST_CHAR or self.widths[code] == 0:
+                    code = REPLACEMENT_CODE
+                # codes are written into literal strings
+                if code in ESCAPED_CODES:
+                    self._char_to_code[char] = bytes([BACKSLASH, code])
+                else:
+                    self._char_to_code[char] = bytes([code])
+            b.extend(self._char_to_code[char])
+        return bytes(b)
+
+    def get_cids_width(self, cid_bytes: bytes | bytearray) -> int:
+        width = 0
+        escaped = False
+        for code in cid_bytes:
+            if code == BACKSLASH and not escaped:
+                escaped = True
+                continue
+            escaped = False
+            width += self.widths[code]
+        return width
+
+    def get_text_widths(self, strings: list[str], font_size: float) -> np.ndarray:
+        import numpy as np
+
+        widths = np.array(
+            [
+                self.get_cids_width(self.get_cid_in_bytes(string.translate(ZERO_WIDTH_CHARS)) or b"")
+                for string in strings
+            ],
+            dtype=np.float64,
+        )
+        return widths * font_size / 1000
+
+    def glyph_count(self) -> int:
+        return 0
+
+    def source_fingerprint(self) -> str:
+        return self.base_font
+
+    def clone(self) -> PdfStandardFont:
+        return PdfStandardFont(self.name, self.base_font)
+
+    def fork(self) -> PdfStandardFont:
+        return PdfStandardFont(self.name, self.base_font)
+
+    def close(self) -> None:
+        pass
+
+    def generate_pdf_obj(self, collector: Collector):
+        self.obj_num = collector.new_obj()
+
+    def prepare_streams(
+        self,
+        should_compress: bool,
+        embedding_profile: str = "fidelity",
+        compressed_stream_cache: None | CompressedStreamCache = None,
+    ) -> None:
+        pass
+
+    def build(
+        self,
+        should_compress: bool,
+        embedding_profile: str = "fidelity",
+        compressed_stream_cache: None | CompressedStreamCache = None,
+    ):
+        if self.obj_num is None:
+            raise ValueError("Font object is missing.")
+        self.obj_num.set_attribute_value("/Type", "/Font")
+        self.obj_num.set_attribute_value("/Subtype", "/Type1")
+        self.obj_num.set_attribute_value("/BaseFont", f"/{self.base_font}")
+        self.obj_num.set_attribute_value("/Encoding", "/WinAnsiEncoding")
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+from typing import TYPE_CHECKING
+
+from .core import update_digest
+from .pdf import Pdf
+from .pdf import create_fonts
+from .pdf import unique_fonts
+from .pdf_font import PdfFont
+from .pdf_page import PdfPage
+from .pdf_settings import PDFSettings
+from .pdf_standard_font import PdfStandardFont
+
+
+if TYPE_CHECKING:
+    from docugenr8_shared.dto import Dto
+    from docugenr8_shared.dto import DtoTextArea
+    from docugenr8_shared.dto import DtoTextBox
+
+
+class PdfTemplate:
+    """Document compiled once and rendered with different slot contents.
+
+    Slots are text areas or text boxes of the base document. Everything
+    else is generated once, and each rendered document only generates the
+    contents given for its slots.
+    """
+
+    def __init__(
+        self,
+        dto: Dto,
+        slots: dict[str, DtoTextArea | DtoTextBox],
+        debug: bool = False,
+        standard_fonts: None | dict[str, str] = None,
+    ) -> None:
+        self.debug = debug
+        self.standard_fonts = {} if standard_fonts is None else standard_fonts
+        self.fonts: dict[str, PdfFont | PdfStandardFont] = {}
+        self._pages: list[PdfPage] = []
+        # page contents split at the slots, slots are given by name
+        self._page_parts: list[list[bytes | str]] = []
+        self._slot_contents: dict[str, bytes] = {}
+        self._digest = hashlib.new("md5", usedforsecurity=False)
+        self._compile(dto, slots)
+
+    def _compile(self, dto: Dto, slots: dict[str, DtoTextArea | DtoTextBox]) -> None:
+        slot_names = {id(content): slot_name for slot_name, content in slots.items()}
+        self.fonts = create_fonts(dto.fonts, self.standard_fonts)
+        for pdf_font in unique_fonts(self.fonts):
+            if isinstance(pdf_font, PdfFont):
+                pdf_font.stream_cache = {}
+        for font_name, pdf_font in self.fonts.items():
+            update_digest(self._digest, (font_name, pdf_font.source_fingerprint()), {})
+        for dto_page in dto.pages:
+            update_digest(self._digest, (dto_page.width, dto_page.height), {})
+            pdf_page = PdfPage(dto_page.width, dto_page.height)
+            # start and end of each slot in the page contents
+            slot_ranges: list[tuple[str, int, int]] = []
+            for content in dto_page.contents:
+                slot_name = slot_names.get(id(content))
+                if slot_name is None:
+                    update_digest(self._digest, content, {})
+                    pdf_page.add_dto_page_contents([content], self.fonts, self.debug)
+                    continue
+                update_digest(self._digest, slot_name, {})
+                slot_start = pdf_page.contents_length()
+                pdf_page.add_dto_page_contents([content], self.fonts, self.debug)
+                slot_ranges.append((slot_name, slot_start, pdf_page.contents_length()))
+            self._pages.append(pdf_page)
+            self._page_parts.append(self._split_contents(pdf_page.contents_bytes(), slot_ranges))
+        missing_slots = slots.keys() - self._slot_contents.keys()
+        if len(missing_slots) > 0:
+            raise ValueError(f"Slots not found in the document: {', '.join(sorted(missing_slots))}.")
+
+    def _split_contents(self, contents: bytes, slot_ranges: list[tuple[str, int, int]]) -> list[bytes | str]:
+        page_parts: list[bytes | str] = []
+        static_start = 0
+        for slot_name, slot_start, slot_end in slot_ranges:
+            if slot_start > static_start:
+                page_parts.append(contents[static_start:slot_start])
+            page_parts.append(slot_name)
+            self._slot_contents[slot_name] = contents[slot_start:slot_end]
+            static_start = slot_end
+        if len(contents) > static_start:
+            page_parts.append(contents[static_start:])
+        return page_parts
+
+    def render(
+        self,
+        values: dict[str, DtoTextArea | DtoTextBox],
+        settings: None | PDFSettings = None,
+    ) -> Pdf:
+        """Creates a document with the given slot contents.
+
+        Slots that are not given keep the contents of the base document.
+        Debug and standard fonts of the given settings are replaced with
+        the ones of the template.
+        """
+        unknown_slots = values.keys() - self._slot_contents.keys()
+        if len(unknown_slots) > 0:
+            raise ValueError(f"Slots not defined in the template: {', '.join(sorted(unknown_slots))}.")
+        # settings are copied, so the given ones can be used for other documents
+        settings = PDFSettings() if settings is None else copy.copy(settings)
+        settings.debug = self.debug
+        settings.standard_fonts = self.standard_fonts
+        pdf = Pdf(settings=settings)
+        pdf.set_digest(self._digest)
+        pdf.add_to_digest(sorted(values.items(), key=lambda item: item[0]))
+        clones = {id(font): font.clone() for font in unique_fonts(self.fonts)}
+        pdf.fonts = {font_name: clones[id(font)] for font_name, font in self.fonts.items()}
+        for template_page, page_parts in zip(self._pages, self._page_parts, strict=True):
+            pdf_page = PdfPage(*template_page.page_size(), settings.content_spill_threshold)
+            pdf_page.use_page_fonts(template_page, pdf.fonts)
+            pdf_page.has_debug_layer = template_page.has_debug_layer
+            for part in page_parts:
+                if isinstance(part, bytes):
+                    pdf_page.add_compiled_contents(part)
+                elif part in values:
+                    pdf_page.add_dto_page_contents([values[part]], pdf.fonts, self.debug)
+                else:
+                    pdf_page.add_compiled_contents(self._slot_contents[part])
+            if all(isinstance(part, bytes) for part in page_parts):
+                # pages without slots share their compressed contents
+                template_page.compress_stream(settings.compressed_stream_cache)
+                pdf_page.compressed_stream = template_page.compressed_stream
+            pdf.pages.append(pdf_page)
+        return pdf
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from .pdf_content import escape_literal
+from .pdf_content import fill_color_operator
+
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from .pdf_font import PdfFont
+    from .pdf_standard_font import PdfStandardFont
+
+
+# skipped by get_cid_in_bytes, so they are not encoded and take no space
+SKIPPED_CODE_POINTS = (9, 10, 13)
+# two cid bytes, each of which may be escaped
+MAX_ESCAPED_CODE_LENGTH = 4
+# rounded values up to this many units of the last digit are formatted
+# from integers, as their shortest float repr is then a plain decimal
+MAX_FORMATTED_UNITS = 10**12
+# distance from a rounding tie below which Python's round is used instead
+TIE_TOLERANCE = 1e-3
+
+
+def format_rounded(values: np.ndarray, digits: int) -> np.ndarray:
+    # str(round(value, digits)) of every value as an object array, made
+    # from integers, as formatting floats one by one is slow for large text
+    import numpy as np
+
+    if len(values) == 0:
+        return np.array([], dtype=object)
+    if values.dtype.kind in "iub":
+        return values.astype(np.int64).astype(str).astype(object)
+    scale = 10**digits
+    scaled = values.astype(np.float64) * scale
+    with np.errstate(invalid="ignore"):
+        rounded = np.rint(scaled)
+        magnitudes = np.abs(rounded)
+        # ties may round differently after scaling, and values below 1e-4
+        # are written with an exponent, so these are given to round and str
+        exact = (
+            (np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) > TIE_TOLERANCE)
+            & (magnitudes < MAX_FORMATTED_UNITS)
+            & ((magnitudes == 0) | (magnitudes * 10**4 >= scale))
+        )
+    units = np.where(exact, magnitudes, 0).astype(np.int64)
+    fractions = np.char.rstrip(np.char.zfill((units % scale).astype(str), digits), "0")
+    texts = np.char.add(
+        np.char.add(np.where(np.signbit(rounded), "-", ""), (units // scale).astype(str)),
+        np.char.add(".", np.where(fractions == "", "0", fractions)),
+    ).astype(object)
+    inexact = np.flatnonzero(~exact)
+    texts[inexact] = [str(round(value, digits)) for value in values[inexact].tolist()]
+    return texts
+
+
+class PdfTextColumns:
+    """Text fragments given as columns instead of DtoFragment objects.
+
+    Fragment i has the characters text[offsets[i]:offsets[i + 1]], is drawn
+    at x[i] on baseline[i] and uses the font name and color of
+    styles[style_index[i]]. Text can be a string or an array of code
+    points, and any column can be a memory-mapped array. The characters
+    of all fragments are encoded per font at once, so no Python object is
+    made per character or per DtoFragment.
+    """
+
+    def __init__(
+        self,
+        text: str | np.ndarray,
+        offsets: np.ndarray,
+        x: np.ndarray,
+        baseline: np.ndarray,
+        font_size: np.ndarray,
+        style_index: np.ndarray,
+        styles: list[tuple[str, tuple[int, int, int]]],
+    ) -> None:
+        import numpy as np
+
+        if isinstance(text, str):
+            self.code_points = np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+        else:
+            self.code_points = np.asarray(text, dtype=np.uint32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        # coordinates and sizes keep their type, so integers are written as integers
+        self.x = np.asarray(x)
+        self.baseline = np.asarray(baseline)
+        self.font_size = np.asarray(font_size)
+        self.style_index = np.asarray(style_index, dtype=np.int64)
+        self.styles = styles
+        num_of_fragments = len(self.x)
+        if any(len(column) != num_of_fragments for column in (self.baseline, self.font_size, self.style_index)):
+            raise ValueError("Text columns must have the same length.")
+        if len(self.offsets) != num_of_fragments + 1:
+            raise ValueError("Text offsets must have one more entry than the other columns.")
+        if num_of_fragments > 0 and (
+            self.offsets[0] < 0 or self.offsets[-1] > len(self.code_points) or np.any(np.diff(self.offsets) < 0)
+        ):
+            raise ValueError("Text offsets must be ascending and within the text.")
+        if num_of_fragments > 0 and (self.style_index.min() < 0 or self.style_index.max() >= len(styles)):
+            raise ValueError("Style index is out of range.")
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def content_digest(self) -> str:
+        digest = hashlib.sha256()
+        for column in (self.code_points, self.offsets, self.x, self.baseline, self.font_size, self.style_index):
+            digest.update(column.dtype.str.encode())
+            digest.update(column.tobytes())
+        digest.update(repr(self.styles).encode())
+        return digest.hexdigest()
+
+    def _encode(
+        self,
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
+    ) -> tuple[bytes, np.ndarray, np.ndarray]:
+        # returns the cid bytes of all fragments escaped for literal strings,
+        # where the bytes of each fragment start, and the width of each
+        # fragment in font units
+        import numpy as np
+
+        first, last = (int(self.offsets[0]), int(self.offsets[-1])) if len(self) > 0 else (0, 0)
+        code_points = self.code_points[first:last]
+        font_names = list(dict.fromkeys(style[0] for style in self.styles))
+        style_fonts = np.array([font_names.index(style[0]) for style in self.styles], dtype=np.int64)
+        char_fonts = np.repeat(style_fonts[self.style_index], np.diff(self.offsets))
+        encoded = ~np.isin(code_points, SKIPPED_CODE_POINTS)
+        code_lengths = np.zeros(len(code_points), dtype=np.int64)
+        code_bytes = np.zeros((len(code_points), MAX_ESCAPED_CODE_LENGTH), dtype=np.uint8)
+        widths = np.zeros(len(code_points), dtype=np.int64)
+        for font_index, font_name in enumerate(font_names):
+            font_chars = encoded & (char_fonts == font_index)
+            if not font_chars.any():
+                continue
+            pdf_font = pdf_fonts[font_name]
+            font_code_points = code_points[font_chars]
+            unique_code_points, first_uses, code_point_indexes = np.unique(
+                font_code_points, return_index=True, return_inverse=True
+            )
+            # cids are allocated in the order of first use, like for dto fragments
+            unique_chars = [chr(code_point) for code_point in unique_code_points.tolist()]
+            unique_codes: list[bytes] = [b""] * len(unique_chars)
+            for index in np.argsort(first_uses, kind="stable").tolist():
+                unique_codes[index] = pdf_font.get_cid_in_bytes(unique_chars[index]) or b""
+            unique_widths = np.array([pdf_font.get_cids_width(code) for code in unique_codes], dtype=np.int64)
+            escaped_codes = [bytes(escape_literal(code)) for code in unique_codes]
+            unique_lengths = np.array([len(code) for code in escaped_codes], dtype=np.int64)
+            unique_bytes = np.array(
+                [code.ljust(MAX_ESCAPED_CODE_LENGTH, b"\x00") for code in escaped_codes],
+                dtype=f"S{MAX_ESCAPED_CODE_LENGTH}",
+            )
+            code_lengths[font_chars] = unique_lengths[code_point_indexes]
+            code_bytes[font_chars] = unique_bytes.view(np.uint8).reshape(-1, MAX_ESCAPED_CODE_LENGTH)[
+                code_point_indexes
+            ]
+            widths[font_chars] = unique_widths[code_point_indexes]
+        data = code_bytes[np.arange(MAX_ESCAPED_CODE_LENGTH) < code_lengths[:, None]].tobytes()
+        char_offsets = self.offsets - first
+        byte_totals = np.concatenate(([0], np.cumsum(code_lengths)))
+        width_totals = np.concatenate(([0], np.cumsum(widths)))
+        fragment_widths = width_totals[char_offsets[1:]] - width_totals[char_offsets[:-1]]
+        return data, byte_totals[char_offsets], fragment_widths
+
+    def text_object(
+        self,
+        pdf_fonts: dict[str, PdfFont | PdfStandardFont],
+        page_height: float,
+        page_font_name: Callable[[str], str],
+    ) -> bytes:
+        """Returns the text object drawing all fragments, from BT to ET.
+
+        Operators of all fragments are made from the columns at once, and
+        are the same as for a text area with the same fragments.
+        """
+        import numpy as np
+
+        data, byte_offsets, widths = self._encode(pdf_fonts)
+        # fragments without cids are not drawn and do not change the text state
+        drawn = np.flatnonzero(np.diff(byte_offsets) > 0)
+        if len(drawn) == 0:
+            return b"BT\nET\n"
+        x = self.x[drawn]
+        y = page_height - self.baseline[drawn]
+        font_size = self.font_size[drawn]
+        widths = widths[drawn]
+        # equal styles given at different indexes are the same text state
+        equal_styles: dict[tuple[str, tuple[int, int, int]], int] = {}
+        style_states = np.array(
+            [equal_styles.setdefault(style, index) for index, style in enumerate(self.styles)], dtype=np.int64
+        )[self.style_index[drawn]]
+        new_state = np.ones(len(drawn), dtype=bool)
+        new_state[1:] = (font_size[1:] != font_size[:-1]) | (style_states[1:] != style_states[:-1])
+        # fragments sharing baseline and text state are merged into one TJ
+        new_run = new_state.copy()
+        new_run[1:] |= y[1:] != y[:-1]
+        new_run |= font_size == 0
+        prefixes = np.full(len(drawn), "(", dtype=object)
+        run_starts = np.flatnonzero(new_run)
+        prefixes[run_starts] = self._run_prefixes(x[run_starts], y[run_starts])
+        state_starts = np.flatnonzero(new_state)
+        prefixes[state_starts] = (
+            self._text_states(style_states[state_starts], font_size[state_starts], page_font_name)
+            + prefixes[state_starts]
+        )
+        prefixes[run_starts[1:]] = "] TJ\n" + prefixes[run_starts[1:]]
+        # adjustments of fragments continuing a run, from the end of the previous one
+        continued = np.flatnonzero(~new_run)
+        previous = continued - 1
+        run_ends = x[previous] + widths[previous] * font_size[previous] / 1000
+        adjustments = format_rounded((run_ends - x[continued]) * 1000 / font_size[continued], 3)
+        prefixes[continued] = np.where((adjustments != "0.0") & (adjustments != "-0.0"), adjustments + "(", "(")
+        prefix_list = prefixes.tolist()
+        prefix_bytes = "".join(prefix_list).encode("ascii")
+        prefix_lengths = np.fromiter(map(len, prefix_list), dtype=np.int64, count=len(prefix_list))
+        data_lengths = byte_offsets[drawn + 1] - byte_offsets[drawn]
+        # every fragment is its prefix, its cids and the closing parenthesis,
+        # copied from one buffer holding all prefixes, all cids and ")"
+        source = np.frombuffer(prefix_bytes + data + b")", dtype=np.uint8)
+        source_starts = np.stack(
+            (
+                np.cumsum(prefix_lengths) - prefix_lengths,
+                len(prefix_bytes) + byte_offsets[drawn],
+                np.full(len(drawn), len(prefix_bytes) + len(data)),
+            ),
+            axis=1,
+        ).ravel()
+        lengths = np.stack((prefix_lengths, data_lengths, np.ones(len(drawn), dtype=np.int64)), axis=1).ravel()
+        output_starts = np.cumsum(lengths) - lengths
+        positions = np.repeat(source_starts - output_starts, lengths) + np.arange(int(lengths.sum()))
+        return b"BT\n" + source[positions].tobytes() + b"] TJ\nET\n"
+
+    def _run_prefixes(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        # runs start with a Td from the start of the previous run, and the
+        # first one from the origin, which makes its offsets floats
+        import numpy as np
+
+        x_offsets = np.concatenate((format_rounded(x[:1] - 0.0, 6), format_rounded(x[1:] - x[:-1], 6)))
+        y_offsets = np.concatenate((format_rounded(y[:1] - 0.0, 6), format_rounded(y[1:] - y[:-1], 6)))
+        run_prefixes: np.ndarray = x_offsets + " " + y_offsets + " Td\n[("
+        return run_prefixes
+
+    def _text_states(
+        self,
+        style_states: np.ndarray,
+        font_size: np.ndarray,
+        page_font_name: Callable[[str], str],
+    ) -> np.ndarray:
+        # Tf and fill color of each text state change
+        import numpy as np
+
+        font_operators = np.full(len(self.styles), "", dtype=object)
+        color_operators = np.full(len(self.styles), "", dtype=object)
+        _, first_uses = np.unique(style_states, return_index=True)
+        # page font names are given in the order the fonts are first used
+        for style in style_states[np.sort(first_uses)].tolist():
+            font_name, font_color = self.styles[style]
+            font_operators[style] = f"/{page_font_name(font_name)} "
+            color_operators[style] = " Tf\n" + fill_color_operator(font_color)
+        unique_font_sizes, font_size_indexes = np.unique(font_size, return_inverse=True)
+        font_sizes = np.array([str(size) for size in unique_font_sizes.tolist()], dtype=object)
+        text_states: np.ndarray = (
+            font_operators[style_states] + font_sizes[font_size_indexes] + color_operators[style_states]
+        )
+        return text_states
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import random
+from collections.abc import Callable
+from io import BytesIO
+
+import pytest
+from docugenr8_shared.dto import Dto
+from docugenr8_shared.dto import DtoFont
+from docugenr8_shared.dto import DtoFragment
+from docugenr8_shared.dto import DtoPage
+from docugenr8_shared.dto import DtoParagraph
+from docugenr8_shared.dto import DtoRectangle
+from docugenr8_shared.dto import DtoTextArea
+from docugenr8_shared.dto import DtoTextLine
+from docugenr8_shared.dto import DtoWord
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+
+TEXT = "Hello, world (1\\2)"
+
+
+def _build_font(code_points: list[int], seed: int = 0) -> bytes:
+    # glyphs are in shuffled order, so cmap segments need glyph id arrays
+    glyph_names = [f"glyph{index}" for index in range(len(code_points))]
+    random.Random(seed).shuffle(glyph_names)
+    builder = FontBuilder(1000, isTTF=True)
+    builder.setupGlyphOrder([".notdef", *sorted(glyph_names, key=lambda name: int(name[5:]))])
+    builder.setupCharacterMap(dict(zip(code_points, glyph_names, strict=True)))
+    pen = TTGlyphPen(None)
+    pen.moveTo((50, 0))
+    pen.lineTo((50, 700))
+    pen.lineTo((450, 700))
+    pen.lineTo((450, 0))
+    pen.closePath()
+    glyph = pen.glyph()
+    builder.setupGlyf({".notdef": glyph, **dict.fromkeys(glyph_names, glyph)})
+    builder.setupHorizontalMetrics(
+        {".notdef": (500, 50), **{name: (400 + int(name[5:]) % 7 * 50, 50) for name in glyph_names}}
+    )
+    builder.setupHorizontalHeader(ascent=800, descent=-200)
+    builder.setupNameTable({"familyName": "Test Sans", "styleName": "Regular"})
+    builder.setupOS2(sCapHeight=700, usWeightClass=400)
+    builder.setupPost()
+    font_file = BytesIO()
+    builder.save(font_file)
+    return font_file.getvalue()
+
+
+@pytest.fixture(scope="session")
+def build_font() -> Callable[[list[int]], bytes]:
+    return _build_font
+
+
+@pytest.fixture(scope="session")
+def font_data() -> bytes:
+    return _build_font([*range(32, 127), *range(0xC0, 0x180), 0x2013, 0x20AC])
+
+
+@pytest.fixture
+def make_dto(font_data: bytes) -> Callable[[int], Dto]:
+    def make(pages: int) -> Dto:
+        dto = Dto()
+        dto.fonts.append(DtoFont("Test", font_data))
+        for page_index in range(pages):
+            page = DtoPage(595, 842)
+            text_area = DtoTextArea(50, 50, 400, 300)
+            paragraph = DtoParagraph(50, 50, text_area)
+            text_area.paragraphs.append(paragraph)
+            for line in range(3):
+                text_line = DtoTextLine(50, 50 + line * 20, paragraph, 0)
+                paragraph.textlines.append(text_line)
+                word = DtoWord(50, 50 + line * 20, text_line)
+                text_line.words.append(word)
+                fragment = DtoFragment(50, 50 + line * 20, word)
+                fragment.chars = f"{TEXT} {page_index}"
+                fragment.baseline = 65 + line * 20
+                fragment.font_name = "Test"
+                fragment.font_size = 12
+                fragment.font_color = (0, 0, 0)
+                fragment.width = 200
+                text_area.fragments.append(fragment)
+            page.contents.append(text_area)
+            page.contents.append(
+                DtoRectangle(100, 400, 100, 50, 0, 0, 0, 0, (200, 0, 0), (0, 0, 0), 1.0, (0, 0, 0, 0, 0))
+            )
+            dto.pages.append(page)
+        return dto
+
+    return make
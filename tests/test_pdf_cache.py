@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from docugenr8_shared.dto import DtoFont
+
+from docugenr8_pdf import CompressedStreamCache
+from docugenr8_pdf import FontCache
+from docugenr8_pdf import RenderCache
+from docugenr8_pdf.pdf import create_font
+from docugenr8_pdf.pdf_font import PdfFont
+from docugenr8_pdf.pdf_standard_font import PdfStandardFont
+
+
+def test_cold_font_is_parsed_once_by_concurrent_threads(font_data: bytes) -> None:
+    cache = FontCache()
+    parses = []
+    threads = 8
+    barrier = threading.Barrier(threads)
+
+    def parse() -> PdfFont | PdfStandardFont:
+        parses.append(threading.get_ident())
+        # long enough for the other threads to ask for the font meanwhile
+        time.sleep(0.1)
+        return create_font(DtoFont("Test", font_data), {})
+
+    def fork(_: int) -> PdfFont | PdfStandardFont:
+        barrier.wait()
+        return cache.fork(("digest", "Test"), parse)
+
+    with ThreadPoolExecutor(threads) as executor:
+        forks = list(executor.map(fork, range(threads)))
+    assert len(parses) == 1
+    assert (cache.misses, cache.hits) == (1, threads - 1)
+    assert len({id(font.ttfont) for font in forks if isinstance(font, PdfFont)}) == 1
+
+
+def test_clear_resets_counters(tmp_path: Path) -> None:
+    render_cache = RenderCache()
+    render_cache.put("key", b"document")
+    render_cache.get("key")
+    render_cache.get("missing")
+    render_cache.clear()
+    assert (len(render_cache), render_cache.size, render_cache.hits, render_cache.misses) == (0, 0, 0, 0)
+    stream_cache = CompressedStreamCache(directory=tmp_path)
+    stream_cache.compress([b"stream"])
+    stream_cache.compress([b"stream"])
+    stream_cache.clear()
+    stream_cache.compress([b"stream"])
+    stream_cache.clear()
+    assert (stream_cache.size, stream_cache.hits, stream_cache.disk_hits, stream_cache.misses) == (0, 0, 0, 0)
+
+
+def test_directory_is_pruned_to_its_bound(tmp_path: Path) -> None:
+    foreign_file = tmp_path / "notes.txt"
+    foreign_file.write_bytes(b"x" * 10_000)
+    stream_cache = CompressedStreamCache(max_entries=1, directory=tmp_path, max_directory_size=20_000)
+    streams = [os.urandom(4_000) for _ in range(20)]
+    for stream in streams:
+        stream_cache.compress([stream])
+        assert sum(path.stat().st_size for path in tmp_path.iterdir() if path != foreign_file) <= 20_000
+    assert foreign_file.exists()
+    # the latest streams are still read back from the directory
+    stream_cache.clear()
+    assert stream_cache.compress([streams[-1]]) == zlib.compress(streams[-1])
+    assert stream_cache.disk_hits == 1
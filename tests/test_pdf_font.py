@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import pytest
+
+from docugenr8_pdf.pdf_font import PdfFont
+
+
+def test_text_widths_match_cid_widths(font_data: bytes) -> None:
+    pytest.importorskip("numpy")
+    font = PdfFont("Test", font_data)
+    strings = ["Hello", "", "a\tb\n", "\ud800x", "€–", "\U0001f600"]
+    widths = font.get_text_widths(strings, 10)
+    for string, width in zip(strings, widths.tolist(), strict=True):
+        # tabs and new lines are not encoded
+        cids = font.get_cid_in_bytes("".join(char for char in string if char not in "\t\n")) or b""
+        assert width == pytest.approx(font.get_cids_width(cids) * 10 / 1000)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from io import BytesIO
+
+import pytest
+from fontTools import ttLib
+
+from docugenr8_pdf.pdf_font_tables import CMAP_SEGMENT_MAPPING
+from docugenr8_pdf.pdf_font_tables import CMAP_SEGMENTED_COVERAGE
+from docugenr8_pdf.pdf_font_tables import FontTables
+
+
+BMP_CODE_POINTS = [*range(32, 127), *range(0xC0, 0x250, 3), 0x2013, 0x20AC, 0xFB01]
+SUPPLEMENTARY_CODE_POINTS = [*BMP_CODE_POINTS, *range(0x1F600, 0x1F650), 0x10FFFD]
+
+
+def glyph_ids(ttfont: ttLib.TTFont) -> dict[int, int]:
+    reverse_glyph_map = ttfont.getReverseGlyphMap()
+    return {code_point: reverse_glyph_map[name] for code_point, name in ttfont.getBestCmap().items()}
+
+
+@pytest.mark.parametrize(
+    ("code_points", "cmap_format"),
+    [(BMP_CODE_POINTS, CMAP_SEGMENT_MAPPING), (SUPPLEMENTARY_CODE_POINTS, CMAP_SEGMENTED_COVERAGE)],
+)
+def test_glyph_id_matches_best_cmap(
+    build_font: Callable[[list[int]], bytes], code_points: list[int], cmap_format: int
+) -> None:
+    ttfont = ttLib.TTFont(BytesIO(build_font(code_points)), lazy=True)
+    tables = FontTables(ttfont)
+    expected = glyph_ids(ttfont)
+    assert tables._cmap_format == cmap_format
+    for code_point in [*range(0x300), *code_points, 0xFFFF, 0x1F5FF, 0x1F650, 0x10FFFF]:
+        assert tables.glyph_id(code_point) == expected.get(code_point, 0)
+
+
+@pytest.mark.parametrize("code_points", [BMP_CODE_POINTS, SUPPLEMENTARY_CODE_POINTS])
+def test_glyph_id_array_matches_best_cmap(build_font: Callable[[list[int]], bytes], code_points: list[int]) -> None:
+    np = pytest.importorskip("numpy")
+    ttfont = ttLib.TTFont(BytesIO(build_font(code_points)), lazy=True)
+    table = FontTables(ttfont).code_point_to_glyph_id_array()
+    expected = np.zeros(len(table), dtype=np.uint16)
+    for code_point, glyph_id in glyph_ids(ttfont).items():
+        expected[code_point] = glyph_id
+    assert np.array_equal(table, expected)
+
+
+def test_advance_width_matches_hmtx(build_font: Callable[[list[int]], bytes]) -> None:
+    ttfont = ttLib.TTFont(BytesIO(build_font(BMP_CODE_POINTS)), lazy=True)
+    tables = FontTables(ttfont)
+    for glyph_id, glyph_name in enumerate(ttfont.getGlyphOrder()):
+        assert tables.advance_width(glyph_id) == ttfont["hmtx"][glyph_name][0]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from io import BytesIO
+
+import pytest
+from docugenr8_shared.dto import Dto
+
+from docugenr8_pdf import Pdf
+from docugenr8_pdf import PdfImage
+
+
+Image = pytest.importorskip("PIL.Image")
+pikepdf = pytest.importorskip("pikepdf")
+
+
+def encode(image: Image.Image, image_format: str, **options: object) -> bytes:
+    image_file = BytesIO()
+    image.save(image_file, image_format, **options)
+    return image_file.getvalue()
+
+
+def source_image() -> Image.Image:
+    image = Image.new("RGB", (60, 40))
+    image.putdata([(x * 4, y * 6, (x * y) % 256) for y in range(40) for x in range(60)])
+    return image
+
+
+IMAGES = {
+    "jpeg_rgb": lambda: encode(source_image(), "JPEG", quality=90),
+    "jpeg_gray": lambda: encode(source_image().convert("L"), "JPEG"),
+    "jpeg_cmyk": lambda: encode(source_image().convert("CMYK"), "JPEG"),
+    "png_rgb": lambda: encode(source_image(), "PNG"),
+    "png_gray": lambda: encode(source_image().convert("L"), "PNG"),
+    "png_indexed": lambda: encode(source_image().convert("P", palette=Image.Palette.ADAPTIVE, colors=16), "PNG"),
+    "png_1bit": lambda: encode(source_image().convert("1"), "PNG"),
+}
+
+
+@pytest.mark.parametrize("compression", [False, True])
+@pytest.mark.parametrize("name", list(IMAGES))
+def test_image_decodes_to_source_pixels(make_dto: Callable[[int], Dto], name: str, compression: bool) -> None:
+    data = IMAGES[name]()
+    pdf = Pdf(make_dto(1))
+    pdf.settings.compression = compression
+    pdf.pages[0].add_image(PdfImage(data), 20, 700, 60, 40)
+    with pikepdf.open(BytesIO(pdf.output_to_bytes())) as document:
+        xobject = document.pages[0].Resources.XObject.Im1
+        decoded = pikepdf.PdfImage(xobject).as_pil_image()
+    source = Image.open(BytesIO(data))
+    assert decoded.size == source.size
+    assert decoded.convert("RGB").tobytes() == source.convert("RGB").tobytes()
+
+
+def test_identical_images_share_one_xobject(make_dto: Callable[[int], Dto]) -> None:
+    data = IMAGES["png_rgb"]()
+    pdf = Pdf(make_dto(2))
+    for page in pdf.pages:
+        page.add_image(PdfImage(data), 20, 700, 60, 40)
+        page.add_image(PdfImage(bytearray(data)), 100, 700, 60, 40)
+    with pikepdf.open(BytesIO(pdf.output_to_bytes())) as document:
+        xobjects = {page.Resources.XObject[name].objgen for page in document.pages for name in page.Resources.XObject}
+    assert len(xobjects) == 1
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"GIF89a", lambda: encode(source_image().convert("RGBA"), "PNG")],
+)
+def test_unsupported_image_is_rejected(data: bytes | Callable[[], bytes]) -> None:
+    with pytest.raises(ValueError, match="supported"):
+        PdfImage(data() if callable(data) else data)
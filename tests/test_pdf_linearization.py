@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+from io import BytesIO
+
+import pytest
+from docugenr8_shared.dto import Dto
+
+from docugenr8_pdf import Pdf
+from docugenr8_pdf.pdf_linearization import pad
+
+
+pikepdf = pytest.importorskip("pikepdf")
+
+
+@pytest.mark.parametrize("compression", [False, True])
+@pytest.mark.parametrize("pages", [1, 4])
+def test_linearized_output_passes_qpdf_check(make_dto: Callable[[int], Dto], compression: bool, pages: int) -> None:
+    pdf = Pdf(make_dto(pages))
+    pdf.settings.compression = compression
+    pdf.settings.linearize = True
+    with pikepdf.open(BytesIO(pdf.output_to_bytes())) as document:
+        assert document.is_linearized
+        assert document.check_linearization()
+        assert document.get_warnings() == []
+        assert len(document.pages) == pages
+
+
+def test_linearized_output_keeps_text(make_dto: Callable[[int], Dto]) -> None:
+    dto = make_dto(3)
+    pdf = Pdf(dto)
+    linearized_pdf = Pdf(dto)
+    linearized_pdf.settings.linearize = True
+    with (
+        pikepdf.open(BytesIO(pdf.output_to_bytes())) as document,
+        pikepdf.open(BytesIO(linearized_pdf.output_to_bytes())) as linearized_document,
+    ):
+        for page, linearized_page in zip(document.pages, linearized_document.pages, strict=True):
+            contents = pikepdf.unparse_content_stream(pikepdf.parse_content_stream(page))
+            assert contents == pikepdf.unparse_content_stream(pikepdf.parse_content_stream(linearized_page))
+
+
+def test_pad_fills_up_to_length() -> None:
+    assert pad(b"<< /L 1", 10) == b"<< /L 1   "
+
+
+def test_pad_rejects_value_longer_than_length() -> None:
+    with pytest.raises(ValueError, match="does not fit"):
+        pad(b"<< /L 12345", 5)
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+
+import pytest
+from docugenr8_shared.dto import Dto
+
+from docugenr8_pdf import Pdf
+from docugenr8_pdf import split_output
+from docugenr8_pdf.pdf_settings import PDFSettings
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_split_documents_match_separate_documents(make_dto: Callable[[int], Dto], workers: int) -> None:
+    dto = make_dto(5)
+    settings = PDFSettings()
+    settings.deterministic = True
+    page_ranges = [(0, 2), (2, 3), (3, 5)]
+    outputs = []
+    for pdf in split_output(dto, page_ranges, settings, workers):
+        outputs.append(pdf.output_to_bytes())
+        pdf.close()
+    expected = []
+    for first_page, last_page in page_ranges:
+        part = Dto()
+        part.fonts = dto.fonts
+        part.pages = dto.pages[first_page:last_page]
+        expected.append(Pdf(part, settings).output_to_bytes())
+    assert outputs == expected
+
+
+def test_split_rejects_invalid_range_before_rendering(make_dto: Callable[[int], Dto]) -> None:
+    with pytest.raises(ValueError, match="not valid"):
+        split_output(make_dto(2), [(0, 1), (1, 3)])
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from collections.abc import Callable
+
+import pytest
+from docugenr8_shared.dto import Dto
+from docugenr8_shared.dto import DtoTextArea
+
+from docugenr8_pdf import Pdf
+from docugenr8_pdf import PdfTextColumns
+from docugenr8_pdf.pdf_page import PdfPage
+from docugenr8_pdf.pdf_text_columns import format_rounded
+
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.mark.parametrize("digits", [3, 6])
+def test_format_rounded_matches_round_and_str(digits: int) -> None:
+    rng = np.random.default_rng(0)
+    values = np.concatenate(
+        (
+            rng.normal(0, 1000, 10_000),
+            rng.normal(0, 1e-4, 1_000),
+            np.arange(-2000, 2000) / 2000,
+            [0.0, -0.0, 1e-9, -1e-9, 2.675, 0.0005, 1e15, -1e20, np.inf, -np.inf, np.nan],
+        )
+    )
+    expected = [str(round(value, digits)) for value in values.tolist()]
+    assert format_rounded(values, digits).tolist() == expected
+    assert format_rounded(np.array([]), digits).tolist() == []
+    integers = np.arange(-50, 50)
+    assert format_rounded(integers, digits).tolist() == [str(value) for value in integers.tolist()]
+
+
+def test_text_columns_draw_like_text_area(make_dto: Callable[[int], Dto]) -> None:
+    dto = make_dto(1)
+    text_area = dto.pages[0].contents[0]
+    assert isinstance(text_area, DtoTextArea)
+    fragments = text_area.fragments
+    fragments[1].chars = ""
+    fragments[2].font_size = 0
+    styles = [("Test", (0, 0, 0)), ("Test", (255, 0, 0)), ("Test", (0, 0, 0))]
+    for index, fragment in enumerate(fragments):
+        fragment.font_color = styles[index % 3][1]
+    pdf = Pdf(dto)
+    page = PdfPage(dto.pages[0].width, dto.pages[0].height)
+    page.add_text_columns(
+        PdfTextColumns(
+            "".join(fragment.chars for fragment in fragments),
+            np.cumsum([0, *(len(fragment.chars) for fragment in fragments)]),
+            np.array([fragment.x for fragment in fragments]),
+            np.array([fragment.baseline for fragment in fragments]),
+            np.array([fragment.font_size for fragment in fragments]),
+            np.arange(len(fragments)) % 3,
+            styles,
+        ),
+        pdf.fonts,
+    )
+    text_area_page = PdfPage(dto.pages[0].width, dto.pages[0].height)
+    text_area_page.add_dto_page_contents([text_area], Pdf(dto).fonts, False)
+    assert page._page_content.getvalue() == text_area_page._page_content.getvalue()